@@ -1,4 +1,5 @@
-import json
+import os
+import sys
 import numpy as np
 from collections import Counter
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -8,87 +9,35 @@ from sklearn.svm import SVC
 from sklearn.metrics import classification_report
 import pandas as pd
 
-# ---- step 1: reading the files ----
-files = {
-    "D1": "dicta_by_source/dicta_D1.json",
-    "D2": "dicta_by_source/dicta_D2.json",
-    "Dn": "dicta_by_source/dicta_Dn.json",
-    "E": "dicta_by_source/dicta_E.json",
-    "J": "dicta_by_source/dicta_J.json",
-    "O": "dicta_by_source/dicta_O.json",
-    "P": "dicta_by_source/dicta_P.json",
-    "R": "dicta_by_source/dicta_R.json",
-}
-
-# Mapping book names to numbers according to trees.py
-book_map = {
-    "Genesis": "0",
-    "Exodus": "1",
-    "Leviticus": "2",
-    "Numbers": "3",
-    "Deuteronomy": "4"
-}
-
-# Function for extracting roots (lemmas) and parts of speech (POS)
-def extract_features(entry):
-    words = []
-    lemmas = []
-    pos_tags = []
-    
-    for token in entry["prediction"][0]["tokens"]:
-        words.append(token["token"])  
-        lemmas.append(token["lex"])  
-        pos_tags.append(token["morph"]["pos"])  
-
-    return " ".join(words), " ".join(lemmas), " ".join(pos_tags)
-
-# Loading the verses and their book + releasing additional features
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dicta_store import load_store, load_source_index
+from excel_stream import write_frames
+from teamim_tree_store import load_trees
+from teamim_tree_features import tree_pattern_matrix
+
+# ---- step 1: reading the dicta store through the source index (built by dependency_structure_by_source.py) ----
+store = load_store("dicta_store")
+source_index = load_source_index("dicta_by_source/source_index.npz")
+
+# Words, roots (lemmas) and parts of speech (POS) of every verse, and its source as the label.
+# Verse ids use the book numbers of teamim-trees.py
 verses = []
 lemmas_list = []
 pos_list = []
 labels = []
 verse_ids = []
 
-for label, file_path in files.items():
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-        for entry in data:
-            book_number = book_map[entry['book']]
-            verse_id = f"{book_number}:{entry['chapter']}:{entry['verse']}"
-            words, lemmas, pos_tags = extract_features(entry)  
-
-            verses.append(words)
-            lemmas_list.append(lemmas)
-            pos_list.append(pos_tags)
-            labels.append(label)  
-            verse_ids.append(verse_id)
-
-# ---- step 2: reading the dependency tree (teamim-trees_combined.txt) ----
-tree_file_path = "teamim-trees_combined.txt"
-
-trees = {}
-with open(tree_file_path, "r", encoding="utf-8") as f:
-    lines = f.readlines()
-    current_verse = None
-    tree_structure = []
-    current_source = None
-
-    for line in lines:
-        line = line.strip()
-        if line.startswith("source:"):
-            if current_verse is not None and tree_structure:
-                trees[current_verse] = " ".join(tree_structure)
-            current_source = line.split(":")[1].strip() 
-        elif line.startswith("P:"):
-            if current_verse is not None and tree_structure:
-                trees[current_verse] = " ".join(tree_structure)
-            current_verse = line.split("P:")[-1].strip()  
-            tree_structure = []
-        elif line:
-            tree_structure.append(line)
-
-    if current_verse is not None and tree_structure:
-        trees[current_verse] = " ".join(tree_structure)
+for label in ["D1", "D2", "Dn", "E", "J", "O", "P", "R"]:
+    source_verses = source_index.get(label, [])
+    verses.extend(store.verse_strings("token", source_verses))
+    lemmas_list.extend(store.verse_strings("lemma", source_verses))
+    pos_list.extend(store.verse_strings("pos", source_verses))
+    labels.extend([label] * len(source_verses))
+    verse_ids.extend(store.verse_ids(source_verses))
+
+# ---- step 2: reading the teamim trees (teamim-trees.npz, built by teamim-trees.py) ----
+# The labels of every tree in preorder, by verse id
+trees = load_trees().texts()
 
 # ---- step 3: Integrate all features separately ----
 combined_texts_words = []
@@ -116,6 +65,9 @@ X_lemmas = vectorizer.fit_transform(combined_texts_lemmas)
 X_pos = vectorizer.fit_transform(combined_texts_pos)
 X_tree = vectorizer.fit_transform(combined_texts_tree)
 
+# hashed path and subtree patterns of the teamim trees (see teamim_tree_features.py), in the order of verse_ids
+X_tree_patterns = tree_pattern_matrix(keys=verse_ids)
+
 y_combined = np.array(labels)
 
 # ---- step 5: training and evaluating the model separately for each feature ----
@@ -163,6 +115,12 @@ all_results["POS"] = (classification_results_rf, classification_results_svm)
 # tree feature 
 cv_accuracy_rf, cv_accuracy_svm, classification_results_rf, classification_results_svm = evaluate_model(X_tree, y_combined)
 all_results["Tree"] = (classification_results_rf, classification_results_svm)
+print(f"Tree: RF {cv_accuracy_rf:.3f}, SVM {cv_accuracy_svm:.3f} cross-validation accuracy")
+
+# tree patterns feature
+cv_accuracy_rf, cv_accuracy_svm, classification_results_rf, classification_results_svm = evaluate_model(X_tree_patterns, y_combined)
+all_results["Tree Patterns"] = (classification_results_rf, classification_results_svm)
+print(f"Tree Patterns: RF {cv_accuracy_rf:.3f}, SVM {cv_accuracy_svm:.3f} cross-validation accuracy")
 
 # ---- step 6: processing with TF-IDF for all features together ----
 combined_texts_all = [words + " " + lemmas + " " + pos_tags + " " + tree_info
@@ -187,15 +145,14 @@ cv_accuracy_rf, cv_accuracy_svm, classification_results_rf, classification_resul
 all_results["Words + Lemmas"] = (classification_results_rf, classification_results_svm)
 
 # ---- step 8: saving the results to an Excel file ----
-with pd.ExcelWriter('classification_results_by_source.xlsx') as writer:
-    for feature_name, (classification_results_rf, classification_results_svm) in all_results.items():
-        # יצירת DataFrame עבור כל מאפיין
-        df_rf = pd.DataFrame(classification_results_rf).transpose()
-        df_svm = pd.DataFrame(classification_results_svm).transpose()
-
-        # כתיבה לגיליון מתאים
-        df_rf.to_excel(writer, sheet_name=f"RF_{feature_name}")
-        df_svm.to_excel(writer, sheet_name=f"SVM_{feature_name}")
+frames = {}
+for feature_name, (classification_results_rf, classification_results_svm) in all_results.items():
+    # יצירת DataFrame עבור כל מאפיין
+    frames[f"RF_{feature_name}"] = pd.DataFrame(classification_results_rf).transpose()
+    frames[f"SVM_{feature_name}"] = pd.DataFrame(classification_results_svm).transpose()
+
+# כתיבה לגיליון מתאים
+write_frames('classification_results_by_source.xlsx', frames)
 
 
 print("התוצאות נשמרו בהצלחה בקובץ 'classification_results_by_source.xlsx'")
@@ -1,72 +1,34 @@
-import xml.etree.ElementTree as ET
-import os
-import pandas as pd
+from corpus_table import TableWriter, table_path
+from excel_stream import StreamingExcelWriter
+from shebanq_parser import iter_phrases, iter_books
+
+COLUMNS = ["Book", "Chapter", "Verse", "Sentence ID", "Clause ID", "Phrase ID", "Function", "Phrase Type"]
 
 
 def parse_syntactic_structure_with_words(file_path):
     """
     Parse XML and extract syntactic structures while adding chapter and verse numbers.
+    Yields one row per phrase, streaming the file (see shebanq_parser.py).
     """
-    tree = ET.parse(file_path)
-    root = tree.getroot()
-
-    namespaces = {"tei": "http://www.tei-c.org/ns/1.0"}
-    results = []
-    book_name = os.path.basename(file_path).replace(".xml", "")
-
-    # Find all chapters
-    for chapter in root.findall(".//tei:div2", namespaces):
-        chapter_number = chapter.attrib.get("DisplayName_Eng", "").replace("Chapter ", "")
-
-        # Find all verses within the chapter
-        for pasuk in chapter.findall(".//tei:s", namespaces):
-            pasuk_number = pasuk.attrib.get("DisplayName_Eng", "").replace("Pasuk ", "")
-
-            # Find all syntactic structures within the verse
-            syntactic_info = pasuk.find(".//tei:syntacticInfo", namespaces)
-            if syntactic_info is not None:
-                for sentence in syntactic_info.findall(".//tei:sentence", namespaces):
-                    sentence_id = sentence.attrib.get("id", "Unknown")
-
-                    clauses = sentence.findall(".//tei:clause", namespaces)
-                    for clause in clauses:
-                        clause_id = clause.attrib.get("id", "Unknown")
-                        phrases = clause.findall(".//tei:phrase", namespaces)
-                        for phrase in phrases:
-                            phrase_id = phrase.attrib.get("id", "Unknown")
-                            function = phrase.attrib.get("function", "Unknown")
-                            phrase_type = phrase.attrib.get("type", "Unknown")
-
-                            results.append({
-                                "Book": book_name, 
-                                "Chapter": chapter_number,
-                                "Verse": pasuk_number,
-                                "Sentence ID": sentence_id,
-                                "Clause ID": clause_id,
-                                "Phrase ID": phrase_id,
-                                "Function": function,
-                                "Phrase Type": phrase_type,
-                            })
-    return results
+    return iter_phrases(file_path)
 
 
-def process_files_to_excel(file_paths, output_file):
+def process_files_to_table(file_paths, table_name, output_excel, workers=None):
     """
-    Process multiple XML files and export results to Excel.
+    Process multiple XML files and save the results as a corpus table. The books are parsed on a
+    process pool and merged in the order of file_paths; the table and the Excel report are both
+    streamed, in batches of rows, as each book arrives.
     """
-    all_results = []
-    for file_path in file_paths:
-        print(f"Processing: {file_path}")
-        results = parse_syntactic_structure_with_words(file_path)
-        all_results.extend(results)
+    books = iter_books(file_paths, iter_phrases, workers)
+    with StreamingExcelWriter(output_excel) as writer, TableWriter(table_name, COLUMNS) as table:
+        writer.add_sheet("Sheet1", COLUMNS)
+        for file_path, rows in books:
+            print(f"Processing: {file_path}")
+            for row in rows:
+                writer.write(row)
+                table.write(row)
 
-    df = pd.DataFrame(all_results)
-    
-    column_order = ["Book", "Chapter", "Verse", "Sentence ID", "Clause ID", "Phrase ID", "Function", "Phrase Type"]
-    df = df[column_order]
-    
-    df.to_excel(output_file, index=False)
-    print(f"Results exported to {output_file}")
+    print(f"Results saved to {table_path(table_name)} and {output_excel}")
 
 files = [
     'SHEBANQ/Genesis.xml',
@@ -76,6 +38,5 @@ files = [
     'SHEBANQ/Deuteronomy.xml'
 ]
 
-# Process files and export results to Excel
-output_excel = "clauses_structure.xlsx"
-process_files_to_excel(files, output_excel)
+# Process files into the table, and into Excel for reading
+process_files_to_table(files, "clauses_structure", "clauses_structure.xlsx")
@@ -1,30 +1,29 @@
 import pandas as pd
+from corpus_table import read_table, write_table, export_excel
+from verse_registry import verse_ids, verse_sources
 
-def merge_bible_data(file1_path, file2_path, sheet_name1="Sheet1", sheet_name2="Sheet1"):
-    # Load the Excel files
-    xls1 = pd.ExcelFile(file1_path)
-    xls2 = pd.ExcelFile(file2_path)
+def merge_bible_data(table_name):
+    # Load the clauses table
+    df1 = read_table(table_name)
+    df1["Book"] = df1["Book"].astype(str).str.lower()
     
-    # Read data from the specified sheets
-    df1 = pd.read_excel(xls1, sheet_name=sheet_name1)
-    df2 = pd.read_excel(xls2, sheet_name=sheet_name2)
+    # The source of every verse, by verse id (built from the books_to_sources table)
+    sources, source_names = verse_sources()
     
-    # Standardize column names for merging
-    df1["Book"] = df1["Book"].str.lower()
-    df2["Book"] = df2["Book"].str.lower()
-    
-    # Merge the datasets based on 'Book', 'Chapter', and 'Verse'
-    merged_df = pd.merge(df1, df2, on=["Book", "Chapter", "Verse"], how="inner")
+    # Looking up the source of every row through its verse id, keeping only the verses that have a source
+    ids = verse_ids(df1["Book"].to_numpy(), df1["Chapter"].to_numpy(), df1["Verse"].to_numpy())
+    row_sources = pd.Series(sources[ids], index=df1.index).where(ids >= 0, -1)
+    merged_df = df1[row_sources >= 0].copy()
+    merged_df["Source"] = pd.Categorical.from_codes(row_sources[row_sources >= 0], source_names)
     
     return merged_df
 
 # Example usage
-file1_path = "clauses_structure.xlsx"
-file2_path = "books_to_sources.xlsx"
-merged_df = merge_bible_data(file1_path, file2_path)
+merged_df = merge_bible_data("clauses_structure")
 
-# Save the merged data to a new Excel file
-merged_df.to_excel("clause_structure_by_source.xlsx", index=False)
+# Save the merged data as a new table, and as Excel for reading
+write_table(merged_df, "clause_structure_by_source")
+export_excel("clause_structure_by_source", "clause_structure_by_source.xlsx")
 
 # Display the first few rows of the merged data
 #print(merged_df.head())
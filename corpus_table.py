@@ -0,0 +1,162 @@
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from excel_stream import write_excel
+
+"""Typed columnar tables (Parquet) that the stages of the pipeline pass to each other instead of Excel files.
+Book, source, function and phrase type columns are stored as categories and chapter and verse as
+integers. read_table reads only the requested columns and can filter rows while reading;
+Excel files are written only as reports, with export_excel."""
+
+CORPUS_DIR = "corpus"
+
+# Rows of one row group of a table written with TableWriter
+BATCH_SIZE = 10000
+
+CATEGORICAL_COLUMNS = ["Book", "Source", "Function", "Phrase Type"]
+INTEGER_COLUMNS = {"Chapter": "int16", "Verse": "int16"}
+
+# The Excel files that the tables replace, for importing them and for the load time benchmark
+EXCEL_FILES = {
+    "books_to_sources": "books_to_sources.xlsx",
+    "clauses_structure": "clauses_structure.xlsx",
+    "clause_structure_by_source": "clause_structure_by_source.xlsx",
+}
+
+
+def table_path(name, corpus_dir=CORPUS_DIR):
+    return os.path.join(corpus_dir, f"{name}.parquet")
+
+
+def to_typed(df):
+    # Categories for the repeated labels, small integers for the verse keys
+    df = df.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    for column, dtype in INTEGER_COLUMNS.items():
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column]).astype(dtype)
+    return df
+
+
+def write_table(df, name, corpus_dir=CORPUS_DIR):
+    os.makedirs(corpus_dir, exist_ok=True)
+    to_typed(df).to_parquet(table_path(name, corpus_dir), engine="pyarrow", index=False)
+
+
+class TableWriter:
+    """
+    Writes a table as it is produced, batch_size rows at a time, each batch as a row group of the
+    Parquet file, so memory holds one batch whatever the size of the table:
+        with TableWriter("clauses_structure", columns) as writer:
+            for row in rows:
+                writer.write(row)
+
+    A row is a dict keyed by column or a sequence in the order of the columns. The columns are typed
+    as in write_table.
+    """
+
+    def __init__(self, name, columns, batch_size=BATCH_SIZE, corpus_dir=CORPUS_DIR):
+        os.makedirs(corpus_dir, exist_ok=True)
+        self.path = table_path(name, corpus_dir)
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.rows = []
+        self.rows_written = 0
+        self.writer = None
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows and self.writer is not None:
+            return
+        table = pa.Table.from_pandas(to_typed(pd.DataFrame(self.rows, columns=self.columns)), preserve_index=False)
+        if self.writer is None:
+            # The categories of every batch are different, so the schema has the widest index type
+            self.schema = pa.schema([
+                field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                if pa.types.is_dictionary(field.type) else field
+                for field in table.schema
+            ])
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table.cast(self.schema))
+        self.rows_written += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        # An empty table is still written, with its columns
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_table(name, columns=None, filters=None, corpus_dir=CORPUS_DIR):
+    """
+    Read a table, or only some of its columns. filters are pyarrow row filters such as
+    [("Source", "!=", "Unknown")], applied while reading. A table that hasn't been written yet is
+    imported once from the Excel file it replaces.
+    """
+    ensure_table(name, corpus_dir)
+    return pd.read_parquet(table_path(name, corpus_dir), engine="pyarrow", columns=columns, filters=filters)
+
+
+def ensure_table(name, corpus_dir=CORPUS_DIR):
+    # Importing the Excel file of a table that hasn't been written yet
+    if not os.path.exists(table_path(name, corpus_dir)) and name in EXCEL_FILES:
+        import_excel(name, corpus_dir=corpus_dir)
+    return table_path(name, corpus_dir)
+
+
+def iter_rows(name, batch_size=10000, corpus_dir=CORPUS_DIR):
+    # The rows of a table as tuples, read one batch at a time
+    table = pq.ParquetFile(ensure_table(name, corpus_dir))
+    for batch in table.iter_batches(batch_size=batch_size):
+        yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+def export_excel(name, excel_path, corpus_dir=CORPUS_DIR):
+    # Reporting step: an Excel copy of a table, streamed batch by batch
+    columns = pq.ParquetFile(ensure_table(name, corpus_dir)).schema_arrow.names
+    write_excel(excel_path, columns, iter_rows(name, corpus_dir=corpus_dir))
+
+
+def import_excel(name, excel_path=None, corpus_dir=CORPUS_DIR):
+    # Converting one of the existing Excel files into a table
+    write_table(pd.read_excel(excel_path or EXCEL_FILES[name]), name, corpus_dir)
+
+
+def benchmark_load(corpus_dir=CORPUS_DIR):
+    """
+    Load time of every table against the read_excel call it replaces.
+    """
+    for name, excel_path in EXCEL_FILES.items():
+        start = time.perf_counter()
+        excel_df = pd.read_excel(excel_path)
+        excel_time = time.perf_counter() - start
+
+        if not os.path.exists(table_path(name, corpus_dir)):
+            write_table(excel_df, name, corpus_dir)
+
+        start = time.perf_counter()
+        read_table(name, corpus_dir=corpus_dir)
+        table_time = time.perf_counter() - start
+
+        print(f"{name}: read_excel {excel_time * 1000:.0f} ms, parquet {table_time * 1000:.1f} ms "
+              f"({excel_time / table_time:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    benchmark_load()
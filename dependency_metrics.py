@@ -0,0 +1,160 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from dicta_store import load_store
+
+"""Dependency tree metrics of all the verses at once.
+The dep_head_idx of every token (the index of its head within the verse, -1 for a root) is taken as
+one flat array with verse offsets, CSR style, as in the dicta store. The path from every token up to its
+root is followed by pointer jumping: each round every token jumps to the ancestor its ancestor has
+reached, so log2(longest verse) rounds are enough, with no recursion. A token that hasn't reached a root
+(or a head outside the verse) after them is on a cycle of heads, or below one, and is counted instead of
+followed forever. The other metrics are array operations over the arcs."""
+
+# Number of crossing tests in one batch of verses
+BATCH_CELLS = 2 ** 22
+
+# Ends of the paths: a root of the verse, and a head index outside the verse
+ROOT = -1
+DETACHED = -2
+
+COLUMNS = ["Depth", "Average Arc Length", "Max Arc Length", "Branching Factor",
+           "Non-projective Arcs", "Root Count", "Cyclic Tokens"]
+
+
+def _verse_segments(values, verse_offsets, function, empty):
+    # function.reduceat over the tokens of every verse, with `empty` for the verses without tokens
+    lengths = np.diff(verse_offsets)
+    result = np.full(len(lengths), empty, dtype=np.result_type(values, type(empty)))
+    non_empty = lengths > 0
+    if non_empty.any():
+        result[non_empty] = function.reduceat(values, verse_offsets[:-1][non_empty])
+    return result
+
+
+def _verse_counts(token_verse, mask, verse_count):
+    # Number of tokens of every verse where mask is set
+    return np.bincount(token_verse[mask], minlength=verse_count)
+
+
+def root_paths(heads, verse_offsets):
+    """
+    For every token: where its path up the heads ends (ROOT, DETACHED, or a token index for a token on or
+    below a cycle) and its level, the number of tokens on the path to its root, itself and the root included.
+    """
+    heads = np.asarray(heads, dtype=np.int64)
+    verse_offsets = np.asarray(verse_offsets, dtype=np.int64)
+    lengths = np.diff(verse_offsets)
+    token_verse = np.repeat(np.arange(len(lengths)), lengths)
+
+    in_verse = (heads >= 0) & (heads < lengths[token_verse])
+    ends = np.where(in_verse, verse_offsets[token_verse] + heads, np.where(heads == -1, ROOT, DETACHED))
+    levels = np.ones(len(heads), dtype=np.int64)
+
+    # After k rounds every token has jumped 2 ** k heads up, or stopped at the end of its path
+    rounds = int(np.ceil(np.log2(max(lengths.max(initial=1), 2)))) + 1
+    for _ in range(rounds):
+        jumping = ends >= 0
+        if not jumping.any():
+            break
+        targets = np.where(jumping, ends, 0)
+        levels = levels + np.where(jumping, levels[targets], 0)
+        ends = np.where(jumping, ends[targets], ends)
+    return ends, levels
+
+
+def dependency_metrics(heads, verse_offsets):
+    """
+    One row per verse:
+        Depth: 1 + the largest level of a token that reaches a root (as compute_tree_depth of the
+            statistics scripts computed it; 1 for a verse without a root)
+        Average Arc Length, Max Arc Length: distance between the tokens of every head -> dependent arc
+        Branching Factor: average number of dependents of a token that has any
+        Non-projective Arcs: number of arcs that cross another one, the roots hanging from a position
+            before the first token
+        Root Count: number of tokens whose head is -1
+        Cyclic Tokens: number of tokens on a cycle of heads or below one
+    """
+    heads = np.asarray(heads, dtype=np.int64)
+    verse_offsets = np.asarray(verse_offsets, dtype=np.int64)
+    lengths = np.diff(verse_offsets)
+    token_verse = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.arange(len(heads)) - verse_offsets[token_verse]
+
+    ends, levels = root_paths(heads, verse_offsets)
+    depths = _verse_segments(np.where(ends == ROOT, levels, 0), verse_offsets, np.maximum, 0) + 1
+
+    # The arcs between two tokens of the verse (a token that is its own head has none)
+    is_arc = (heads >= 0) & (heads < lengths[token_verse]) & (heads != positions)
+    arc_lengths = np.where(is_arc, np.abs(heads - positions), 0)
+    arc_counts = _verse_counts(token_verse, is_arc, len(lengths))
+    arc_sums = np.bincount(token_verse, weights=arc_lengths, minlength=len(lengths))
+
+    # Tokens that are the head of some arc
+    dependents = np.bincount((verse_offsets[token_verse] + heads)[is_arc], minlength=len(heads))
+    head_counts = _verse_counts(token_verse, dependents > 0, len(lengths))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            "Depth": depths,
+            "Average Arc Length": np.where(arc_counts > 0, arc_sums / arc_counts, np.nan),
+            "Max Arc Length": _verse_segments(arc_lengths, verse_offsets, np.maximum, 0),
+            "Branching Factor": np.where(head_counts > 0, arc_counts / head_counts, np.nan),
+            "Non-projective Arcs": non_projective_arcs(heads, verse_offsets),
+            "Root Count": _verse_counts(token_verse, heads == -1, len(lengths)),
+            "Cyclic Tokens": _verse_counts(token_verse, ends >= 0, len(lengths)),
+        }, columns=COLUMNS)
+
+
+def non_projective_arcs(heads, verse_offsets, batch_cells=BATCH_CELLS):
+    """
+    Number of arcs of every verse that cross another arc of the verse. Two arcs (l1, r1) and (l2, r2)
+    cross when l1 < l2 < r1 < r2; a root's arc goes from -1 to the root. The verses are padded to the
+    longest one and tested in batches, with every arc against every other arc of its verse.
+    """
+    heads = np.asarray(heads, dtype=np.int64)
+    verse_offsets = np.asarray(verse_offsets, dtype=np.int64)
+    lengths = np.diff(verse_offsets)
+    counts = np.zeros(len(lengths), dtype=np.int64)
+    longest = int(lengths.max(initial=0))
+    if longest == 0:
+        return counts
+
+    batch_size = max(1, batch_cells // (longest * longest))
+    for first in range(0, len(lengths), batch_size):
+        batch = np.arange(first, min(first + batch_size, len(lengths)))
+
+        # The arcs of the batch in a (verse, token) grid, padded with arcs that cross nothing
+        position = np.arange(longest)
+        present = position[None, :] < lengths[batch, None]
+        token_index = np.where(present, verse_offsets[batch, None] + position[None, :], 0)
+        verse_heads = np.where(present, heads[token_index], DETACHED)
+        is_arc = present & (verse_heads >= -1) & (verse_heads < lengths[batch, None]) & (verse_heads != position[None, :])
+        left = np.where(is_arc, np.minimum(verse_heads, position[None, :]), 0)
+        right = np.where(is_arc, np.maximum(verse_heads, position[None, :]), 0)
+
+        crosses = ((left[:, :, None] < left[:, None, :]) & (left[:, None, :] < right[:, :, None])
+                   & (right[:, :, None] < right[:, None, :]))
+        crosses &= is_arc[:, :, None] & is_arc[:, None, :]
+        crossing = (crosses | crosses.transpose(0, 2, 1)).any(axis=2)
+        counts[batch] = crossing.sum(axis=1)
+    return counts
+
+
+def store_dependency_metrics(store=None):
+    """
+    The metrics of every verse of the dicta store (built by dicta_store.py), in the order of the store.
+    """
+    store = store if store is not None else load_store("dicta_store")
+    return dependency_metrics(store.heads, store.verse_offsets)
+
+
+if __name__ == "__main__":
+    store = load_store("dicta_store")
+    start = time.perf_counter()
+    metrics = store_dependency_metrics(store)
+    elapsed = time.perf_counter() - start
+    print(f"Metrics of {len(metrics)} verses in {elapsed:.3f}s")
+    print(metrics.describe())
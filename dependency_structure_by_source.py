@@ -1,76 +1,22 @@
-import json
-import pandas as pd
-import os
+import numpy as np
+from dicta_store import load_store, save_source_index
+from verse_registry import verse_ids, verse_sources
 
-excel_path = "books_to_sources.xlsx"
+# The source of every verse, by verse id (built from the books_to_sources table)
+sources, source_names = verse_sources()
 
-df_mapping = pd.read_excel(excel_path)
+# The verses of the dicta store (built by dicta_store.py from the files of the books)
+store = load_store("dicta_store")
+ids = verse_ids(store.verse_book, store.verse_chapter, store.verse_number)
 
-# Converting the data into a structure that allows quick access to sources
-source_mapping = {}
-for _, row in df_mapping.iterrows():
-    book = row["Book"].capitalize()  
-    chapter = str(row["Chapter"])
-    verse = str(row["Verse"])
-    source = row["Source"]
-    
-    if book not in source_mapping:
-        source_mapping[book] = {}
-    if chapter not in source_mapping[book]:
-        source_mapping[book][chapter] = {}
+# Finding the source of every verse of the store with one array lookup (-1 when it has no source)
+store_sources = np.where(ids >= 0, sources[np.where(ids >= 0, ids, 0)], -1)
 
-    source_mapping[book][chapter][verse] = source  # Saving the source by book, chapter and verse
-    
-# Create a new folder to save the files by source
-output_dir = "dicta_by_source"
-os.makedirs(output_dir, exist_ok=True)
+# Saving, for every source, the positions of its verses in the store, instead of copying the predictions.
+# Re-attributing a verse to another source only changes these arrays
+source_index = {name: np.flatnonzero(store_sources == code) for code, name in enumerate(source_names)}
+source_index["Unknown"] = np.flatnonzero(store_sources == -1)
+save_source_index(source_index, "dicta_by_source/source_index.npz")
 
-json_files = {
-    "Exodus": "dicta/Exodus_dicta.json",
-    "Genesis": "dicta/Genesis_dicta.json",
-    "Deuteronomy": "dicta/Deuteronomy_dicta.json",
-    "Leviticus": "dicta/Leviticus_dicta.json",
-    "Numbers": "dicta/Numbers_dicta.json"
-}
-
-# Creating a data structure that maps the verses by source
-data_by_source = {}
-
-# Going through all the books, retrieving the text
-for book, json_path in json_files.items():
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as file:
-            data_json = json.load(file)
-
-        for entry in data_json:
-            chapter = str(entry["chapter"])
-            verse = str(entry["verse"])
-            text = entry["text"]
-            prediction = entry.get("prediction", None)  # Adding `prediction` if exists
-            source = source_mapping.get(book, {}).get(chapter, {}).get(verse, "Unknown")
-
-            # Saving the verse in the appropriate source file
-            if source not in data_by_source:
-                data_by_source[source] = []
-
-            entry_data = {
-                "book": book,
-                "chapter": chapter,
-                "verse": verse,
-                "text": text
-            }
-
-            if prediction:
-                entry_data["prediction"] = prediction
-
-            data_by_source[source].append(entry_data)
-
-# Saving data to JSON files divided by source
-output_files = {}
-for source, entries in data_by_source.items():
-    output_json_path = os.path.join(output_dir, f"dicta_{source}.json")
-
-    with open(output_json_path, "w", encoding="utf-8") as output_file:
-        json.dump(entries, output_file, ensure_ascii=False, indent=4)
-
-    output_files[source] = output_json_path
+for source, verses in source_index.items():
+    print(f"{source}: {len(verses)} verses")
@@ -0,0 +1,184 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+
+from dependency_structure import (load_model, read_verses, make_batches, predict_batch, make_record,
+                                  cache_output_style, model_revision, MODEL_NAME, CACHE_DIR, BACKENDS, HEAD_SETS)
+from dicta_cache import PredictionCache
+from dicta_checkpoint import DictaCheckpoint
+
+"""Parses all five books in one run: the verses are split into shards by chapter and the shards are
+spread over a pool of worker processes, each holding its own copy of the model."""
+
+BOOKS = ["Genesis", "Exodus", "Leviticus", "Numbers", "Deuteronomy"]
+
+# Set in every worker process by init_worker
+worker_state = {}
+
+
+class VerseTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise VerseTimeout()
+
+
+def init_worker(threads, batch_size, verse_timeout, retries, cache_dir, backend, heads):
+    # Limit torch to its share of the cores, so the workers don't compete for the same ones
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    signal.signal(signal.SIGALRM, _raise_timeout)
+
+    tokenizer, model = load_model(backend=backend, heads=heads)
+    cache = None
+    if cache_dir:
+        cache = PredictionCache(cache_dir, MODEL_NAME, model_revision(model), cache_output_style(heads), backend)
+    worker_state.update(tokenizer=tokenizer, model=model, batch_size=batch_size,
+                        verse_timeout=verse_timeout, retries=retries, cache=cache)
+
+
+def predict_with_timeout(verses):
+    # The time limit grows with the number of verses in the batch
+    signal.setitimer(signal.ITIMER_REAL, worker_state["verse_timeout"] * len(verses))
+    try:
+        return predict_batch([verse["text"] for verse in verses], worker_state["tokenizer"], worker_state["model"])
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def parse_shard(book, verses):
+    """
+    Parse the verses of one shard in the worker. A batch that fails or times out is retried
+    verse by verse; verses that still fail are returned so a rerun can pick them up.
+    """
+    start = time.perf_counter()
+    records = []
+    failed = []
+
+    cache = worker_state["cache"]
+    hits_before, misses_before = (cache.hits, cache.misses) if cache else (0, 0)
+    if cache is not None:
+        missing = []
+        for verse in verses:
+            prediction = cache.get(verse["text"])
+            if prediction is None:
+                missing.append(verse)
+            else:
+                records.append(make_record(verse, prediction))
+        verses = missing
+
+    for batch in make_batches(verses, worker_state["tokenizer"], worker_state["batch_size"]):
+        batch_verses = [verses[i] for i in batch]
+        try:
+            predictions = predict_with_timeout(batch_verses)
+            for verse, prediction in zip(batch_verses, predictions):
+                store_prediction(records, verse, prediction)
+            continue
+        except (VerseTimeout, RuntimeError):
+            pass
+
+        for verse in batch_verses:
+            for _ in range(worker_state["retries"]):
+                try:
+                    store_prediction(records, verse, predict_with_timeout([verse])[0])
+                    break
+                except (VerseTimeout, RuntimeError):
+                    continue
+            else:
+                failed.append((verse["chapter"], verse["verse"]))
+
+    hits, misses = (cache.hits - hits_before, cache.misses - misses_before) if cache else (0, 0)
+    return book, records, failed, (hits, misses), time.perf_counter() - start
+
+
+def store_prediction(records, verse, prediction):
+    if worker_state["cache"] is not None:
+        worker_state["cache"].put(verse["text"], prediction)
+    records.append(make_record(verse, prediction))
+
+
+def make_shards(book, verses):
+    # One shard per chapter
+    chapters = defaultdict(list)
+    for verse in verses:
+        chapters[verse["chapter"]].append(verse)
+    return [(book, chapter_verses) for chapter_verses in chapters.values()]
+
+
+def parse_all_books(books, xml_dir="TANACH.US", output_dir="dicta", workers=None, batch_size=32,
+                    verse_timeout=30, retries=2, fsync_every=50, cache_dir=CACHE_DIR, backend='fp32',
+                    heads='trimmed'):
+    """
+    Parse all the books on a process pool and write one deterministic <Book>_dicta.json per book.
+    """
+    workers = workers or os.cpu_count()
+    threads = max(1, os.cpu_count() // workers)
+
+    checkpoints = {}
+    shards = []
+    for book in books:
+        checkpoint = DictaCheckpoint(os.path.join(output_dir, f"{book}_dicta.jsonl"), fsync_every)
+        checkpoints[book] = checkpoint
+        verses = read_verses(os.path.join(xml_dir, f"{book}.xml"))
+        remaining = [verse for verse in verses if not checkpoint.is_done(verse["chapter"], verse["verse"])]
+        shards.extend(make_shards(book, remaining))
+
+    # The longest chapters go first, so no worker is left with a big shard at the end
+    shards.sort(key=lambda shard: len(shard[1]), reverse=True)
+    total_verses = sum(len(verses) for _, verses in shards)
+    print(f"{total_verses} verses in {len(shards)} shards, {workers} workers x {threads} threads")
+
+    start = time.perf_counter()
+    all_failed = []
+    cache_hits = 0
+    cache_misses = 0
+    # The workers are started with spawn, since torch does not cope well with fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                             initargs=(threads, batch_size, verse_timeout, retries, cache_dir, backend, heads)) as pool:
+        futures = [pool.submit(parse_shard, book, verses) for book, verses in shards]
+        for future in as_completed(futures):
+            book, records, failed, (hits, misses), seconds = future.result()
+            cache_hits += hits
+            cache_misses += misses
+            for record in records:
+                checkpoints[book].append(record)
+            all_failed.extend((book, chapter, verse) for chapter, verse in failed)
+    elapsed = time.perf_counter() - start
+
+    # The final files are sorted by chapter and verse, whatever order the shards finished in
+    for book, checkpoint in checkpoints.items():
+        count = checkpoint.finalize(os.path.join(output_dir, f"{book}_dicta.json"))
+        print(f"{book}: {count} verses saved")
+
+    verses_per_second = (total_verses - len(all_failed)) / elapsed if elapsed > 0 else 0
+    print(f"Parsed {total_verses - len(all_failed)} verses in {elapsed:.1f}s ({verses_per_second:.2f} verses/s)")
+    if cache_dir:
+        print(f"cache: {cache_hits} hits, {cache_misses} misses")
+    if all_failed:
+        print(f"{len(all_failed)} verses failed and will be parsed again on the next run: {all_failed}")
+    return all_failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dependency parsing of the five books on a process pool")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--verse-timeout", type=float, default=30)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--backend", choices=BACKENDS, default="fp32")
+    parser.add_argument("--heads", choices=tuple(HEAD_SETS), default="trimmed")
+    args = parser.parse_args()
+
+    parse_all_books(BOOKS, workers=args.workers, batch_size=args.batch_size,
+                    verse_timeout=args.verse_timeout, retries=args.retries,
+                    cache_dir=None if args.no_cache else CACHE_DIR, backend=args.backend,
+                    heads=args.heads)
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from source_intervals import read_excerpts
+
+"""Loader for the DH specification files of tanach.us.
+The files are kept in a local mirror directory, with the ETag, Last-Modified and sha256 of each one in a
+.meta.json file next to it. Within max_age of the last check a file is used as it is, without any
+request; after that it is revalidated with a conditional GET and only downloaded again when it changed.
+The excerpts parsed from every file are cached by the file's sha256, so an unchanged file is never parsed twice."""
+
+# Can be set to the address of a local stand-in server
+DH_BASE_URL = os.environ.get("DH_BASE_URL", "https://tanach.us/DH")
+MIRROR_DIR = "DHS"
+EXCERPT_CACHE_DIR = os.path.join(MIRROR_DIR, "excerpts")
+
+MAX_AGE = 24 * 60 * 60  # Seconds before a mirrored file is revalidated
+TIMEOUT = 30
+
+
+def dh_urls(books, base_url=DH_BASE_URL):
+    # base_url can point to a local stand-in server
+    return {book: f"{base_url}/DHSpecification.{book}.xml" for book in books}
+
+
+def make_session(pool_size=5, retries=3):
+    """
+    A session with a connection pool of pool_size and retries with backoff for connection errors
+    and 5xx responses.
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                  allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, data):
+    # Written to a temporary file and renamed, so an interrupted run never leaves half a file
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def fetch_dh_file(session, book, url, mirror_dir=MIRROR_DIR, max_age=MAX_AGE, timeout=TIMEOUT):
+    """
+    Bring the mirrored file of a book up to date. Returns its path, its sha256 and how it was
+    obtained: "fresh" (no request), "not modified" (304) or "downloaded".
+    """
+    file_path = os.path.join(mirror_dir, f"DHSpecification.{book}.xml")
+    meta_path = file_path + ".meta.json"
+    meta = _read_json(meta_path)
+
+    # A mirrored file is only trusted when it still has the hash it was saved with
+    intact = meta is not None and os.path.exists(file_path) and file_sha256(file_path) == meta.get("sha256")
+    if intact and time.time() - meta.get("checked_at", 0) < max_age:
+        return file_path, meta["sha256"], "fresh"
+
+    headers = {}
+    if intact:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = session.get(url, headers=headers, timeout=timeout)
+    if intact and response.status_code == 304:
+        meta["checked_at"] = time.time()
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        return file_path, meta["sha256"], "not modified"
+
+    response.raise_for_status()
+    content = response.content
+    expected_length = response.headers.get("Content-Length")
+    if expected_length is not None and "Content-Encoding" not in response.headers and int(expected_length) != len(content):
+        raise IOError(f"{url}: received {len(content)} bytes instead of {expected_length}")
+
+    sha256 = hashlib.sha256(content).hexdigest()
+    _write_atomic(file_path, content)
+    meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": sha256,
+        "checked_at": time.time(),
+    }
+    _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    return file_path, sha256, "downloaded"
+
+
+def fetch_dh_files(urls, mirror_dir=MIRROR_DIR, max_age=MAX_AGE, workers=5, timeout=TIMEOUT):
+    """
+    Bring the files of all the books (a dict of book to url) up to date concurrently, over one pooled
+    session. Returns the file paths and their sha256 hashes, in the order of urls.
+    """
+    os.makedirs(mirror_dir, exist_ok=True)
+    with make_session(pool_size=workers) as session, ThreadPoolExecutor(workers) as pool:
+        futures = [pool.submit(fetch_dh_file, session, book, url, mirror_dir, max_age, timeout)
+                   for book, url in urls.items()]
+        results = [future.result() for future in futures]
+
+    for book, (_, _, status) in zip(urls, results):
+        print(f"{book}: {status}")
+    return [file_path for file_path, _, _ in results], [sha256 for _, sha256, _ in results]
+
+
+def cached_excerpts(file_paths, hashes=None, cache_dir=EXCERPT_CACHE_DIR):
+    """
+    read_excerpts of the files, with the (range, source) pairs of every file cached under its sha256.
+    The book comes from the file name, as in read_excerpts, so it isn't part of the cache.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    hashes = hashes or [file_sha256(file_path) for file_path in file_paths]
+
+    excerpts = []
+    for file_path, sha256 in zip(file_paths, hashes):
+        cache_path = os.path.join(cache_dir, f"{sha256}.json")
+        ranges = _read_json(cache_path)
+        if ranges is None:
+            ranges = [(verse_range, source) for _, verse_range, source in read_excerpts([file_path])]
+            _write_atomic(cache_path, json.dumps(ranges, ensure_ascii=False).encode("utf-8"))
+
+        book = os.path.basename(file_path).split('.')[1]
+        excerpts.extend((book, verse_range, source) for verse_range, source in ranges)
+    return excerpts
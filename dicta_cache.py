@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import tempfile
+
+
+def normalize_verse_text(text):
+    """
+    The text that is sent to the model and used in the cache key.
+    Changing this only invalidates the verses whose normalized text actually changes.
+    """
+    return " ".join(text.split())
+
+
+class PredictionCache:
+    """
+    On-disk cache of model predictions, one small JSON file per verse.
+    The key is a hash of the normalized verse text, the model id, the model revision, the inference
+    backend and the output style, so a verse that was already parsed with the same model never goes
+    through it again.
+    When the cache grows beyond max_bytes, the least recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir, model_name, revision, output_style='json', backend='fp32', max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.revision = revision
+        self.backend = backend
+        self.output_style = output_style
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.size = sum(entry.stat().st_size for _, entry in self._entries())
+
+    def key(self, text):
+        key_data = json.dumps([normalize_verse_text(text), self.model_name, self.revision,
+                               self.backend, self.output_style], ensure_ascii=False)
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        # Two-letter sub folders keep the number of files per folder small
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _entries(self):
+        for sub_dir in os.scandir(self.cache_dir):
+            if sub_dir.is_dir():
+                for entry in os.scandir(sub_dir.path):
+                    if entry.name.endswith(".json"):
+                        yield sub_dir.name, entry
+
+    def get(self, text):
+        path = self._path(self.key(text))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                prediction = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # Marking the entry as recently used, for the eviction order
+        os.utime(path)
+        self.hits += 1
+        return prediction
+
+    def put(self, text, prediction):
+        path = self._path(self.key(text))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Writing to a temporary file first, so other processes never read a half written entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(prediction, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        self.size += os.path.getsize(path)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Removing the least recently used entries until the cache is back to 90% of its limit
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for _, entry in self._entries())
+        self.size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self.size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    def summary(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0
+        return f"cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), {self.size / 1024 ** 2:.1f} MB"
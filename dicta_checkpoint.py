@@ -0,0 +1,93 @@
+import json
+import os
+
+
+def verse_key(record):
+    # Chapter and verse as integers, so that 10 comes after 9
+    return (int(record["chapter"]), int(record["verse"]))
+
+
+class DictaCheckpoint:
+    """
+    Append-only JSONL file with one parsed verse per line.
+    Lines are flushed after every verse and fsynced every fsync_every verses, so an
+    interrupted run loses at most the last few verses and can continue where it stopped.
+    """
+
+    def __init__(self, jsonl_path, fsync_every=50):
+        self.jsonl_path = jsonl_path
+        self.fsync_every = fsync_every
+        self.done = {}
+        self.last_key = None
+        self._unsynced = 0
+
+        directory = os.path.dirname(jsonl_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._load_existing()
+        self._file = open(jsonl_path, "a", encoding="utf-8")
+
+    def _load_existing(self):
+        # Reading the verses of an earlier run, and cutting off a line that was only half written
+        if not os.path.exists(self.jsonl_path):
+            return
+
+        good_size = 0
+        with open(self.jsonl_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                key = verse_key(record)
+                self.done[key] = record
+                self.last_key = key
+                good_size += len(line)
+
+        if good_size < os.path.getsize(self.jsonl_path):
+            with open(self.jsonl_path, "r+b") as f:
+                f.truncate(good_size)
+
+    def is_done(self, chapter, verse):
+        return (int(chapter), int(verse)) in self.done
+
+    def append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+        key = verse_key(record)
+        self.done[key] = record
+        self.last_key = key
+
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def finalize(self, json_path):
+        """
+        Write all the verses, in chapter and verse order, to the usual <Book>_dicta.json file.
+        """
+        self.close()
+        verse_outputs = [self.done[key] for key in sorted(self.done)]
+
+        with open(json_path, "w", encoding="utf-8") as json_file:
+            json.dump(verse_outputs, json_file, indent=2, ensure_ascii=False)
+        return len(verse_outputs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,42 @@
+import json
+import os
+import time
+
+from dependency_structure import load_model, read_verses, iter_predictions
+
+"""Compares running all the heads of the joint model with the trimmed configuration on one book:
+parsing time and the size of the resulting dicta JSON file."""
+
+
+def run_heads(heads, verses, output_file, batch_size=32):
+    # Runs without the cache, so the timing is the model's own
+    tokenizer, model = load_model(heads=heads)
+
+    start = time.perf_counter()
+    verse_outputs = list(iter_predictions(verses, tokenizer, model, batch_size))
+    elapsed = time.perf_counter() - start
+
+    with open(output_file, "w", encoding="utf-8") as json_file:
+        json.dump(verse_outputs, json_file, indent=2, ensure_ascii=False)
+    return elapsed, os.path.getsize(output_file)
+
+
+def compare_heads(xml_file, output_dir="dicta_heads_benchmark", batch_size=32):
+    os.makedirs(output_dir, exist_ok=True)
+    verses = read_verses(xml_file)
+
+    results = {}
+    for heads in ("all", "trimmed"):
+        output_file = os.path.join(output_dir, f"{heads}_dicta.json")
+        results[heads] = run_heads(heads, verses, output_file, batch_size)
+        elapsed, size = results[heads]
+        print(f"{heads}: {elapsed:.1f}s ({len(verses) / elapsed:.2f} verses/s), {size / 1024 ** 2:.1f} MB")
+
+    (all_time, all_size), (trimmed_time, trimmed_size) = results["all"], results["trimmed"]
+    print(f"Latency: {trimmed_time / all_time * 100:.0f}% of the full model, "
+          f"file size: {trimmed_size / all_size * 100:.0f}% of the full output")
+    return results
+
+
+if __name__ == "__main__":
+    compare_heads("TANACH.US/Deuteronomy.xml")
@@ -0,0 +1,74 @@
+import os
+import time
+
+from dependency_structure import load_model, read_verses, iter_predictions, BACKENDS
+from dependency_structure_parallel import BOOKS
+
+"""Compares a quantized backend with the fp32 model on the whole Pentateuch:
+how often dep_head_idx, lex and pos disagree, and how much faster the backend is."""
+
+COMPARED_FIELDS = {
+    "dep_head_idx": lambda token: token["syntax"]["dep_head_idx"],
+    "lex": lambda token: token["lex"],
+    "pos": lambda token: token["morph"]["pos"],
+}
+
+
+def run_backend(backend, verses_by_book, batch_size=32):
+    # Runs without the cache, so the timing is the model's own
+    tokenizer, model = load_model(backend=backend)
+    tokens_by_verse = {}
+
+    start = time.perf_counter()
+    for book, verses in verses_by_book.items():
+        for record in iter_predictions(verses, tokenizer, model, batch_size):
+            tokens_by_verse[(book, record["chapter"], record["verse"])] = record["prediction"][0]["tokens"]
+    elapsed = time.perf_counter() - start
+
+    return tokens_by_verse, len(tokens_by_verse) / elapsed
+
+
+def compare_tokens(baseline, candidate):
+    """
+    Count the tokens whose fields differ between the two runs. When a verse was tokenized into a
+    different number of tokens, all of its tokens count as disagreements.
+    """
+    disagreements = {field: 0 for field in COMPARED_FIELDS}
+    total_tokens = 0
+
+    for key, baseline_tokens in baseline.items():
+        candidate_tokens = candidate.get(key, [])
+        total_tokens += len(baseline_tokens)
+
+        if len(candidate_tokens) != len(baseline_tokens):
+            for field in COMPARED_FIELDS:
+                disagreements[field] += len(baseline_tokens)
+            continue
+
+        for baseline_token, candidate_token in zip(baseline_tokens, candidate_tokens):
+            for field, get_value in COMPARED_FIELDS.items():
+                if get_value(baseline_token) != get_value(candidate_token):
+                    disagreements[field] += 1
+
+    return disagreements, total_tokens
+
+
+def parity_report(backend, xml_dir="TANACH.US", batch_size=32):
+    verses_by_book = {book: read_verses(os.path.join(xml_dir, f"{book}.xml")) for book in BOOKS}
+
+    baseline, baseline_speed = run_backend("fp32", verses_by_book, batch_size)
+    candidate, candidate_speed = run_backend(backend, verses_by_book, batch_size)
+    disagreements, total_tokens = compare_tokens(baseline, candidate)
+
+    print(f"{len(baseline)} verses, {total_tokens} tokens")
+    for field, count in disagreements.items():
+        print(f"{field}: {count} disagreements ({count / total_tokens * 100:.2f}%)")
+    print(f"fp32: {baseline_speed:.2f} verses/s, {backend}: {candidate_speed:.2f} verses/s "
+          f"({candidate_speed / baseline_speed:.2f}x)")
+    return disagreements, total_tokens, candidate_speed / baseline_speed
+
+
+if __name__ == "__main__":
+    for backend in BACKENDS:
+        if backend != "fp32":
+            parity_report(backend)
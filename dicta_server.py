@@ -0,0 +1,218 @@
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from dependency_structure import (load_model, make_batches, predict_batch, cache_output_style,
+                                  model_revision, MODEL_NAME, CACHE_DIR, BACKENDS, HEAD_SETS)
+from dicta_cache import PredictionCache
+
+"""A long-lived local process that keeps the Dicta model loaded.
+Scripts send verses to http://127.0.0.1:<port>/parse and get back the same "prediction" structure that is
+stored in the dicta JSON files, without paying the torch import and the model load again."""
+
+DEFAULT_PORT = 8765
+
+
+class ParseJob:
+    def __init__(self, texts):
+        self.texts = texts
+        self.predictions = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ParseWorker:
+    """
+    Holds the model and a bounded queue of jobs. A single inference thread takes jobs off the
+    queue, and jobs that arrive within coalesce_seconds of each other are run as one batch.
+    """
+
+    def __init__(self, backend='fp32', heads='trimmed', max_queue=64, max_batch_verses=64, coalesce_seconds=0.01,
+                 cache_dir=CACHE_DIR):
+        self.tokenizer, self.model = load_model(backend=backend, heads=heads)
+        self.backend = backend
+        self.heads = heads
+        self.revision = model_revision(self.model)
+        self.cache = None
+        if cache_dir:
+            self.cache = PredictionCache(cache_dir, MODEL_NAME, self.revision, cache_output_style(heads), backend)
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.max_batch_verses = max_batch_verses
+        self.coalesce_seconds = coalesce_seconds
+        self.parsed_verses = 0
+        self.started = time.time()
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, texts):
+        # Raises queue.Full when the server is overloaded, instead of letting requests pile up
+        job = ParseJob(texts)
+        self.jobs.put_nowait(job)
+        return job
+
+    def _collect_jobs(self, jobs):
+        # Adds the jobs to the given list as they are taken, so that they are all answered if one of them fails
+        jobs.append(self.jobs.get())
+        verse_count = len(jobs[0].texts)
+        deadline = time.monotonic() + self.coalesce_seconds
+
+        while verse_count < self.max_batch_verses:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self.jobs.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            verse_count += len(job.texts)
+        return jobs
+
+    def _run(self):
+        # A failing job is answered with its error, the inference thread itself never stops
+        while True:
+            jobs = []
+            try:
+                self._collect_jobs(jobs)
+                # Identical verses from different requests are only parsed once
+                unique_texts = list(dict.fromkeys(text for job in jobs for text in job.texts))
+                predictions = self._predict(unique_texts)
+                for job in jobs:
+                    job.predictions = [[predictions[text]] for text in job.texts]
+                self.parsed_verses += len(unique_texts)
+            except Exception as e:
+                for job in jobs:
+                    job.error = str(e)
+            for job in jobs:
+                job.done.set()
+
+    def _predict(self, texts):
+        predictions = {}
+        missing = []
+        for text in texts:
+            prediction = self.cache.get(text) if self.cache is not None else None
+            if prediction is None:
+                missing.append(text)
+            else:
+                predictions[text] = prediction
+
+        verses = [{"text": text} for text in missing]
+        for batch in make_batches(verses, self.tokenizer, self.max_batch_verses):
+            batch_texts = [missing[i] for i in batch]
+            for text, prediction in zip(batch_texts, predict_batch(batch_texts, self.tokenizer, self.model)):
+                predictions[text] = prediction
+                if self.cache is not None:
+                    self.cache.put(text, prediction)
+        return predictions
+
+    def health(self):
+        return {
+            "status": "ok" if self.thread.is_alive() else "down",
+            "model": MODEL_NAME,
+            "revision": self.revision,
+            "backend": self.backend,
+            "heads": self.heads,
+            "queued_jobs": self.jobs.qsize(),
+            "parsed_verses": self.parsed_verses,
+            "uptime_seconds": round(time.time() - self.started, 1),
+        }
+
+
+class ParseRequestHandler(BaseHTTPRequestHandler):
+    worker = None
+    request_timeout = 300
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.worker.health())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/parse":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            texts = json.loads(self.rfile.read(length))["verses"]
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                raise TypeError("verses is not a list of strings")
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": 'expected a JSON body of the form {"verses": ["...", ...]}'})
+            return
+
+        try:
+            job = self.worker.submit(texts)
+        except queue.Full:
+            self._send_json(503, {"error": "queue is full, try again later"})
+            return
+
+        if not job.done.wait(self.request_timeout):
+            self._send_json(504, {"error": "parsing timed out"})
+        elif job.error is not None:
+            self._send_json(500, {"error": job.error})
+        else:
+            self._send_json(200, {"predictions": job.predictions})
+
+    def log_message(self, format, *args):
+        # Keeping the console quiet, every request would otherwise be printed
+        pass
+
+
+def serve(port=DEFAULT_PORT, **worker_options):
+    # Listening on the loopback interface only
+    ParseRequestHandler.worker = ParseWorker(**worker_options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), ParseRequestHandler)
+    print(f"Dicta parse worker listening on http://127.0.0.1:{port}")
+    server.serve_forever()
+
+
+def parse_remote(texts, port=DEFAULT_PORT, timeout=300):
+    """
+    Client side: send a list of verse texts to the local worker and return their predictions,
+    in the same structure as the "prediction" field of the dicta JSON files.
+    """
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/parse",
+        data=json.dumps({"verses": texts}, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())["predictions"]
+
+
+def worker_health(port=DEFAULT_PORT, timeout=5):
+    # Returns None when no worker is running on the port
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=timeout) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, OSError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Dicta parse worker")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", choices=BACKENDS, default="fp32")
+    # The same heads as the batch scripts by default, "all" adds the NER and prefix heads
+    parser.add_argument("--heads", choices=tuple(HEAD_SETS), default="trimmed")
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    serve(args.port, backend=args.backend, heads=args.heads, max_queue=args.max_queue, max_batch_verses=args.max_batch)
@@ -0,0 +1,165 @@
+import json
+import os
+
+import numpy as np
+
+"""Columnar store for the Dicta predictions.
+Every token of every verse is one row in a set of flat numpy arrays (interned token, lemma, POS and
+dependency relation ids, and the head index), and verse_offsets marks where each verse starts, CSR style.
+The arrays are saved as .npy files and opened with mmap, so loading the store takes no parsing."""
+
+BOOKS = ["Genesis", "Exodus", "Leviticus", "Numbers", "Deuteronomy"]
+
+DICTA_FILES = {
+    "Genesis": "dicta/Genesis_dicta.json",
+    "Exodus": "dicta/Exodus_dicta.json",
+    "Leviticus": "dicta/Leviticus_dicta.json",
+    "Numbers": "dicta/Numbers_dicta.json",
+    "Deuteronomy": "dicta/Deuteronomy_dicta.json"
+}
+
+STORE_DIR = "dicta_store"
+
+# Token level arrays and their types
+TOKEN_ARRAYS = {
+    "token_ids": np.int32,
+    "lemma_ids": np.int32,
+    "pos_ids": np.int16,
+    "heads": np.int16,
+    "deprel_ids": np.int16,
+}
+
+# Verse level arrays and their types
+VERSE_ARRAYS = {
+    "verse_offsets": np.int64,
+    "verse_label": np.int16,
+    "verse_book": np.int8,
+    "verse_chapter": np.int16,
+    "verse_number": np.int16,
+}
+
+VOCABULARIES = ["token", "lemma", "pos", "deprel"]
+
+
+class Vocabulary:
+    # Gives every distinct string a small integer id, in order of first appearance
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[string] = string_id
+            self.strings.append(string)
+        return string_id
+
+
+def build_store(json_files=DICTA_FILES, store_dir=STORE_DIR):
+    """
+    Convert dicta JSON files into the columnar store. json_files maps a label (a book or a source)
+    to a file; the book of each verse is taken from the entry when it has one, otherwise from the label.
+    """
+    vocabularies = {name: Vocabulary() for name in VOCABULARIES}
+    labels = list(json_files)
+    columns = {name: [] for name in list(TOKEN_ARRAYS) + list(VERSE_ARRAYS)}
+    columns["verse_offsets"].append(0)
+
+    for label_id, (label, json_path) in enumerate(json_files.items()):
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        for entry in data:
+            predictions = entry.get("prediction") or [{"tokens": []}]
+            for token in predictions[0]["tokens"]:
+                columns["token_ids"].append(vocabularies["token"].intern(token["token"]))
+                columns["lemma_ids"].append(vocabularies["lemma"].intern(token["lex"]))
+                columns["pos_ids"].append(vocabularies["pos"].intern(token["morph"]["pos"]))
+                columns["heads"].append(token["syntax"]["dep_head_idx"])
+                columns["deprel_ids"].append(vocabularies["deprel"].intern(token["syntax"].get("dep_func") or ""))
+
+            columns["verse_offsets"].append(len(columns["token_ids"]))
+            columns["verse_label"].append(label_id)
+            columns["verse_book"].append(BOOKS.index(entry.get("book", label).capitalize()))
+            columns["verse_chapter"].append(int(entry["chapter"]))
+            columns["verse_number"].append(int(entry["verse"]))
+
+    os.makedirs(store_dir, exist_ok=True)
+    for name, dtype in {**TOKEN_ARRAYS, **VERSE_ARRAYS}.items():
+        np.save(os.path.join(store_dir, f"{name}.npy"), np.asarray(columns[name], dtype=dtype))
+
+    with open(os.path.join(store_dir, "vocabularies.json"), "w", encoding="utf-8") as f:
+        json.dump({"labels": labels, **{name: vocabularies[name].strings for name in VOCABULARIES}},
+                  f, ensure_ascii=False)
+
+    print(f"Saved {len(columns['verse_label'])} verses and {len(columns['token_ids'])} tokens to {store_dir}")
+
+
+class DictaStore:
+    """
+    The store opened with mmap. Token arrays are indexed by token position in the corpus, verse
+    arrays by verse position; the tokens of verse i are verse_offsets[i]:verse_offsets[i + 1].
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        for name in list(TOKEN_ARRAYS) + list(VERSE_ARRAYS):
+            setattr(self, name, np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r"))
+
+        with open(os.path.join(store_dir, "vocabularies.json"), "r", encoding="utf-8") as f:
+            vocabularies = json.load(f)
+        self.labels = vocabularies["labels"]
+        self.vocabularies = {name: np.array(vocabularies[name], dtype=object) for name in VOCABULARIES}
+
+    def __len__(self):
+        return len(self.verse_label)
+
+    def verse_tokens(self, i, array="token_ids"):
+        return getattr(self, array)[self.verse_offsets[i]:self.verse_offsets[i + 1]]
+
+    def verse_strings(self, vocabulary, verses=None):
+        """
+        One space-joined string per verse, for "token", "lemma" or "pos".
+        verses is an optional array of verse positions, such as one source of a source index.
+        """
+        verses = np.arange(len(self)) if verses is None else verses
+        ids = getattr(self, f"{vocabulary}_ids")
+        strings = self.vocabularies[vocabulary][ids]
+        return [" ".join(strings[self.verse_offsets[i]:self.verse_offsets[i + 1]]) for i in verses]
+
+    def verse_heads(self, verses=None):
+        # The dep_head_idx array of every verse
+        verses = np.arange(len(self)) if verses is None else verses
+        return [np.asarray(self.heads[self.verse_offsets[i]:self.verse_offsets[i + 1]]) for i in verses]
+
+    def verse_ids(self, verses=None):
+        # Verse ids in the book:chapter:verse form of the teamim files
+        verses = np.arange(len(self)) if verses is None else verses
+        return [f"{self.verse_book[i]}:{self.verse_chapter[i]}:{self.verse_number[i]}" for i in verses]
+
+    def verse_labels(self, verses=None):
+        verses = np.arange(len(self)) if verses is None else verses
+        return [self.labels[self.verse_label[i]] for i in verses]
+
+
+def load_store(store_dir=STORE_DIR):
+    return DictaStore(store_dir)
+
+
+def save_source_index(source_index, index_path):
+    """
+    Save the split of the store by source: for every source, the positions of its verses in the store.
+    """
+    directory = os.path.dirname(index_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez(index_path, **{source: np.asarray(verses, dtype=np.int32) for source, verses in source_index.items()})
+
+
+def load_source_index(index_path):
+    with np.load(index_path) as index:
+        return {source: index[source] for source in index.files}
+
+
+if __name__ == "__main__":
+    build_store()
@@ -0,0 +1,133 @@
+import math
+import queue
+import threading
+
+import xlsxwriter
+
+"""Streaming Excel writer for the large reports.
+Rows are written one at a time by an xlsxwriter workbook in constant_memory mode, which flushes every
+row to disk as soon as the next one starts, so memory stays flat whatever the number of rows. The
+workbook runs in its own thread behind a bounded queue, so writing overlaps with producing the rows."""
+
+QUEUE_SIZE = 10000
+
+_DONE = object()
+
+
+def _cell(value):
+    # numpy scalars as python values, NaN and None as empty cells
+    if hasattr(value, "item"):
+        value = value.item()
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+class StreamingExcelWriter:
+    """
+    Usage:
+        with StreamingExcelWriter("report.xlsx") as writer:
+            writer.add_sheet("Sheet1", columns)
+            for row in rows:
+                writer.write(row)
+
+    A row is a sequence in the order of the columns, or a dict keyed by column. Sheets are written
+    one after the other: constant_memory mode can't go back to a sheet or a row that was left.
+    """
+
+    def __init__(self, excel_path, queue_size=QUEUE_SIZE):
+        self.excel_path = excel_path
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.rows_written = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add_sheet(self, sheet_name, columns):
+        self._put(("sheet", sheet_name, list(columns)))
+
+    def write(self, row):
+        self._put(("row", row))
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def _put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def _run(self):
+        workbook = xlsxwriter.Workbook(self.excel_path, {"constant_memory": True, "strings_to_urls": False})
+        worksheet, columns, row_number = None, None, 0
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE:
+                    break
+
+                if item[0] == "sheet":
+                    _, sheet_name, columns = item
+                    worksheet = workbook.add_worksheet(sheet_name[:31])  # Excel's limit on sheet names
+                    worksheet.write_row(0, 0, columns)
+                    row_number = 1
+                    continue
+
+                row = item[1]
+                if isinstance(row, dict):
+                    row = [row.get(column) for column in columns]
+                for column_number, value in enumerate(row):
+                    value = _cell(value)
+                    if value is not None:
+                        worksheet.write(row_number, column_number, value)
+                row_number += 1
+                self.rows_written += 1
+        except Exception as error:
+            self.error = error
+            # Draining the queue so the producer doesn't block, until close()
+            while self.queue.get() is not _DONE:
+                pass
+        finally:
+            # The file is only created here, so a path that can't be written fails in close()
+            try:
+                workbook.close()
+            except Exception as error:
+                self.error = self.error or error
+
+    def close(self):
+        self.queue.put(_DONE)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_excel(excel_path, columns, rows, sheet_name="Sheet1"):
+    """
+    Stream rows from any iterable (a generator, a table reader) into a one sheet Excel file.
+    """
+    with StreamingExcelWriter(excel_path) as writer:
+        writer.add_sheet(sheet_name, columns)
+        writer.write_rows(rows)
+    return writer.rows_written
+
+
+def write_frames(excel_path, frames, index=True):
+    """
+    Stream several DataFrames into one Excel file, one sheet each. frames maps a sheet name to a DataFrame.
+    """
+    with StreamingExcelWriter(excel_path) as writer:
+        for sheet_name, df in frames.items():
+            columns = [str(column) for column in df.columns]
+            if index:
+                writer.add_sheet(sheet_name, [df.index.name or ""] + columns)
+                writer.write_rows(df.itertuples(index=True, name=None))
+            else:
+                writer.add_sheet(sheet_name, columns)
+                writer.write_rows(df.itertuples(index=False, name=None))
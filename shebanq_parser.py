@@ -0,0 +1,350 @@
+import multiprocessing
+import os
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+"""Streaming parser for the SHEBANQ TEI files.
+The file is read with iterparse, one element at a time, and every verse is removed from the tree as
+soon as it has been yielded, so memory holds one verse whatever the size of the book. Chapters, verses,
+sentences, clauses and phrases are recognized by their tag as they open, instead of .// searches."""
+
+TEI = "{http://www.tei-c.org/ns/1.0}"
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+
+CHAPTER = TEI + "div2"
+VERSE = TEI + "s"
+WORD = TEI + "w"
+SYNTACTIC_INFO = TEI + "syntacticInfo"
+SENTENCE = TEI + "sentence"
+CLAUSE = TEI + "clause"
+PHRASE = TEI + "phrase"
+
+BOOK_FILES = [f"SHEBANQ/{book}.xml" for book in ["Genesis", "Exodus", "Leviticus", "Numbers", "Deuteronomy"]]
+
+# Size of the process pool of iter_books; None is one worker per CPU
+WORKERS = None
+
+# Records sent at once by a worker of iter_books, and chunks waiting in the queue of a book
+CHUNK_SIZE = 1000
+QUEUE_CHUNKS = 4
+
+
+def book_name_of(file_path):
+    return os.path.basename(file_path).replace(".xml", "")
+
+
+def iter_verses(file_path, book_name=None):
+    """
+    Yields one record per verse:
+        book, chapter and verse (the numbers of the DisplayName_Eng attributes, as strings; chapter is
+        None for a verse outside a chapter), xml_id, words (the text of every w element inside the verse,
+        as .//w finds them, "" for an empty one), child_words (the same for the w elements that are
+        children of the verse element, as w finds them) and phrases (sentence id, clause id, phrase id,
+        function and type of every phrase of the first syntactic info of the verse).
+    """
+    book_name = book_name or book_name_of(file_path)
+    stack = []
+    chapter_number = None
+    verse = verse_elem = None
+    reading_syntax = False  # Inside the first syntactic info of the verse
+    sentence_id = clause_id = None
+
+    for event, elem in ET.iterparse(file_path, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            stack.append(elem)
+            if tag == CHAPTER:
+                chapter_number = elem.attrib.get("DisplayName_Eng", "").replace("Chapter ", "")
+            elif tag == VERSE:
+                verse = {
+                    "book": book_name,
+                    "chapter": chapter_number,
+                    "verse": elem.attrib.get("DisplayName_Eng", "").replace("Pasuk ", ""),
+                    "xml_id": elem.attrib.get(XML_ID, ""),
+                    "words": [],
+                    "child_words": [],
+                    "phrases": [],
+                }
+                verse_elem = elem
+                syntax_seen = False
+            elif verse is not None:
+                if tag == SYNTACTIC_INFO:
+                    reading_syntax = not syntax_seen
+                    syntax_seen = True
+                elif reading_syntax:
+                    if tag == SENTENCE:
+                        sentence_id = elem.attrib.get("id", "Unknown")
+                    elif tag == CLAUSE and sentence_id is not None:
+                        clause_id = elem.attrib.get("id", "Unknown")
+                    elif tag == PHRASE and clause_id is not None:
+                        verse["phrases"].append((sentence_id, clause_id, elem.attrib.get("id", "Unknown"),
+                                                 elem.attrib.get("function", "Unknown"),
+                                                 elem.attrib.get("type", "Unknown")))
+            continue
+
+        stack.pop()
+        if tag == CHAPTER:
+            chapter_number = None
+            if stack:
+                stack[-1].remove(elem)
+        elif verse is None:
+            continue
+        elif tag == WORD:
+            verse["words"].append(elem.text or "")
+            if stack[-1] is verse_elem:
+                verse["child_words"].append(elem.text or "")
+        elif tag == SENTENCE:
+            sentence_id = None
+        elif tag == CLAUSE:
+            clause_id = None
+        elif tag == SYNTACTIC_INFO:
+            reading_syntax = False
+        elif tag == VERSE:
+            yield verse
+            verse = verse_elem = None
+            # Dropping the verse from the tree, so the parsed part of the document doesn't stay in memory
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+def iter_phrases(file_path, book_name=None):
+    """
+    One flat record per phrase of the verses inside a chapter, with the columns of clauses_structure.
+    """
+    for verse in iter_verses(file_path, book_name):
+        if verse["chapter"] is None:
+            continue
+        for sentence_id, clause_id, phrase_id, function, phrase_type in verse["phrases"]:
+            yield {
+                "Book": verse["book"],
+                "Chapter": verse["chapter"],
+                "Verse": verse["verse"],
+                "Sentence ID": sentence_id,
+                "Clause ID": clause_id,
+                "Phrase ID": phrase_id,
+                "Function": function,
+                "Phrase Type": phrase_type,
+            }
+
+
+def iter_clauses(file_path, book_name=None):
+    """
+    One flat record per clause: its verse, sentence and clause ids and the number of its phrases.
+    """
+    for verse in iter_verses(file_path, book_name):
+        clauses = {}
+        for sentence_id, clause_id, *_ in verse["phrases"]:
+            clauses[(sentence_id, clause_id)] = clauses.get((sentence_id, clause_id), 0) + 1
+        for (sentence_id, clause_id), phrase_count in clauses.items():
+            yield {"Book": verse["book"], "Chapter": verse["chapter"], "Verse": verse["verse"],
+                   "Sentence ID": sentence_id, "Clause ID": clause_id, "Phrase Count": phrase_count}
+
+
+# The chunk queues of the books, inherited by the workers of iter_books when they are forked
+_book_queues = None
+
+
+def _set_book_queues(queues):
+    global _book_queues
+    _book_queues = queues
+
+
+def _send_chunks(parse, file_path, book_number, chunk_size):
+    # Worker side: the records of parse(file_path) go to the queue of the book chunk_size at a time, then
+    # None; returns the CPU time, which unlike wall time doesn't grow when there are more workers than CPUs
+    start = time.process_time()
+    book_queue = _book_queues[book_number]
+    try:
+        chunk = []
+        for record in parse(file_path):
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                book_queue.put(chunk)
+                chunk = []
+        if chunk:
+            book_queue.put(chunk)
+    finally:
+        book_queue.put(None)
+    return time.process_time() - start, os.getpid(), time.time()
+
+
+class _BookRecords:
+    """
+    The records of one book, received from the queue of its worker, or parsed here without a pool. times is
+    the CPU time, pid and end time of the parse once all the records have been read.
+    """
+
+    def __init__(self, parse, file_path, book_queue=None, future=None):
+        self.parse = parse
+        self.file_path = file_path
+        self.book_queue = book_queue
+        self.future = future
+        self.received = False
+        self.times = None
+
+    def __iter__(self):
+        if self.book_queue is None:
+            start = time.process_time()
+            yield from self.parse(self.file_path)
+            self.times = (time.process_time() - start, os.getpid(), time.time())
+            return
+        while (chunk := self.book_queue.get()) is not None:
+            yield from chunk
+        self.received = True
+        # Raises the worker's error, if the parse failed
+        self.times = self.future.result()
+
+    def drain(self):
+        # Reading the rest of a book that was abandoned, so its worker isn't blocked on a full queue
+        if self.book_queue is not None and not self.received and not self.future.cancelled():
+            while self.book_queue.get() is not None:
+                pass
+
+
+def iter_books(file_paths, parse, workers=WORKERS, chunk_size=CHUNK_SIZE):
+    """
+    Run parse(file_path), a module-level generator function such as iter_verses or iter_phrases, for every
+    book on a process pool. Returns a generator of (file_path, records) in the order of file_paths, so the
+    output doesn't depend on which worker finishes first; records iterates over the records of the book as
+    its worker sends them, chunk_size at a time, and the rest of a book is skipped when the next one is taken.
+    Every book has a queue of at most QUEUE_CHUNKS chunks, and a worker that is ahead of the caller waits
+    for it, so memory holds a few chunks per worker whatever the size of the books.
+    When all the books are done, prints the time of every book and every worker and the speedup
+    over parsing them one after another.
+
+    The pool is started with fork, so the scripts calling this aren't run again in the workers; where
+    fork isn't available (Windows), or with workers=1, the books are parsed serially in this process.
+    """
+    workers = workers or os.cpu_count()
+    start = time.time()
+
+    # The workers are started here rather than on the first iteration, before the caller starts any threads
+    if workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return _collect(file_paths, [_BookRecords(parse, file_path) for file_path in file_paths], None, start)
+    context = multiprocessing.get_context("fork")
+    queues = [context.Queue(QUEUE_CHUNKS) for _ in file_paths]
+    pool = ProcessPoolExecutor(min(workers, len(file_paths)), mp_context=context,
+                               initializer=_set_book_queues, initargs=(queues,))
+    books = [_BookRecords(parse, file_path, book_queue, pool.submit(_send_chunks, parse, file_path, number, chunk_size))
+             for number, (file_path, book_queue) in enumerate(zip(file_paths, queues))]
+    return _collect(file_paths, books, pool, start)
+
+
+def _collect(file_paths, books, pool, start):
+    book_times, worker_times = {}, {}
+    finished = start
+    try:
+        for file_path, book in zip(file_paths, books):
+            records = iter(book)
+            yield file_path, records
+            for _ in records:
+                pass
+
+            seconds, pid, finished_at = book.times
+            book_times[file_path] = seconds
+            worker_times[pid] = worker_times.get(pid, 0) + seconds
+            finished = max(finished, finished_at)
+    finally:
+        if pool is not None:
+            # The books that haven't started are cancelled, the others are read to their end
+            pool.shutdown(wait=False, cancel_futures=True)
+            for book in books:
+                book.drain()
+            pool.shutdown()
+
+    serial_time = sum(book_times.values())
+    for file_path, seconds in book_times.items():
+        print(f"{book_name_of(file_path)}: {seconds:.2f}s")
+    if pool is None:
+        print(f"{len(file_paths)} books parsed serially in {serial_time:.2f}s")
+        return
+
+    # The pool's time runs from the submission of the books until the last of them is parsed
+    pool_time = finished - start
+    for worker, (pid, seconds) in enumerate(worker_times.items()):
+        print(f"Worker {worker} (pid {pid}): {seconds:.2f}s")
+    print(f"{len(file_paths)} books in {pool_time:.2f}s with {len(worker_times)} workers, "
+          f"{serial_time:.2f}s of parsing: {serial_time / pool_time:.2f}x speedup over a serial run")
+
+
+def parse_books(file_paths, parse, workers=WORKERS):
+    # The records of every book as a list, in the order of file_paths
+    return [list(records) for _, records in iter_books(file_paths, parse, workers)]
+
+
+def _phrases_with_element_tree(file_path):
+    # The parser that clauses_structure.py used before: the whole document and nested .// searches
+    namespaces = {"tei": "http://www.tei-c.org/ns/1.0"}
+    root = ET.parse(file_path).getroot()
+    book_name = book_name_of(file_path)
+    results = []
+    for chapter in root.findall(".//tei:div2", namespaces):
+        chapter_number = chapter.attrib.get("DisplayName_Eng", "").replace("Chapter ", "")
+        for pasuk in chapter.findall(".//tei:s", namespaces):
+            pasuk_number = pasuk.attrib.get("DisplayName_Eng", "").replace("Pasuk ", "")
+            syntactic_info = pasuk.find(".//tei:syntacticInfo", namespaces)
+            if syntactic_info is None:
+                continue
+            for sentence in syntactic_info.findall(".//tei:sentence", namespaces):
+                for clause in sentence.findall(".//tei:clause", namespaces):
+                    for phrase in clause.findall(".//tei:phrase", namespaces):
+                        results.append({
+                            "Book": book_name,
+                            "Chapter": chapter_number,
+                            "Verse": pasuk_number,
+                            "Sentence ID": sentence.attrib.get("id", "Unknown"),
+                            "Clause ID": clause.attrib.get("id", "Unknown"),
+                            "Phrase ID": phrase.attrib.get("id", "Unknown"),
+                            "Function": phrase.attrib.get("function", "Unknown"),
+                            "Phrase Type": phrase.attrib.get("type", "Unknown"),
+                        })
+    return results
+
+
+def _measure(parse):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = parse()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def benchmark(file_paths):
+    """
+    Time and peak traced memory of the streaming parser against ET.parse with nested findall,
+    consuming the phrase records one at a time as clauses_structure.py does.
+    """
+    for file_path in file_paths:
+        old_count, old_time, old_peak = _measure(lambda: len(_phrases_with_element_tree(file_path)))
+        new_count, new_time, new_peak = _measure(lambda: sum(1 for _ in iter_phrases(file_path)))
+        assert old_count == new_count, (file_path, old_count, new_count)
+        print(f"{book_name_of(file_path)} ({new_count} phrases): "
+              f"ET.parse {old_time:.2f}s / {old_peak / 1024 ** 2:.1f} MB peak, "
+              f"iterparse {new_time:.2f}s / {new_peak / 1024 ** 2:.1f} MB peak")
+
+
+def benchmark_pool(file_paths, workers=WORKERS):
+    """
+    Wall time of parsing the books serially and on the process pool, and a check that the merged
+    results are the same.
+    """
+    start = time.perf_counter()
+    serial = parse_books(file_paths, iter_phrases, workers=1)
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = parse_books(file_paths, iter_phrases, workers)
+    parallel_time = time.perf_counter() - start
+
+    assert serial == parallel
+    print(f"Serial {serial_time:.2f}s, pool {parallel_time:.2f}s: {serial_time / parallel_time:.2f}x")
+
+
+if __name__ == "__main__":
+    benchmark(BOOK_FILES)
+    benchmark_pool(BOOK_FILES)
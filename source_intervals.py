@@ -0,0 +1,239 @@
+import hashlib
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+from verse_registry import BOOKS, CHAPTER_SIZES, MAX_CHAPTER, VERSE_COUNT, verse_ids
+
+"""Sorted interval index of the documentary hypothesis source ranges.
+Every range of the DH specification becomes one interval between two positions, where a position is
+a verse id and a word number packed into one integer. A range may start or end in the middle of a
+verse (3:2.5), so a verse can belong to several sources; lookups are binary searches over the intervals."""
+
+INDEX_CACHE = "source_intervals.npz"
+SHARES_PATH = "books_to_sources_shares.npz"
+
+# Positions are verse_id * WORD_SLOTS + word. Word 0 is the start of a verse and LAST_WORD its end
+WORD_SLOTS = 1000
+LAST_WORD = WORD_SLOTS - 1
+
+RANGE_PATTERN = re.compile(
+    r"^\s*(\d+):(\d+)(?:\.(\d+))?"                    # C:V or C:V.W
+    r"(?:\s*-\s*(?:(\d+):)?(\d+)(?:\.(\d+))?)?\s*$"   # optionally - C:V, - V, - C:V.W or - V.W
+)
+
+
+def _position(book_index, chapter, verse, word):
+    # Verses past the end of a chapter are moved back to its last verse; a chapter the book doesn't have is None
+    if not 1 <= chapter <= MAX_CHAPTER or CHAPTER_SIZES[book_index, chapter] == 0:
+        return None
+    verse = min(verse, CHAPTER_SIZES[book_index, chapter])
+    verse_id = verse_ids(book_index, chapter, verse)
+    if verse_id < 0:
+        return None
+    return int(verse_id) * WORD_SLOTS + word
+
+
+def parse_range(book, verse_range):
+    """
+    Start and end positions of a DH range such as "1:1-2:4.3", "3:2-9" or "4:7.2", or None if the
+    range can't be read, is outside the book or ends before it starts. A range without word numbers
+    covers its verses from the first to the last word.
+    """
+    match = RANGE_PATTERN.match(verse_range)
+    if not match:
+        return None
+
+    start_chapter, start_verse, start_word, end_chapter, end_verse, end_word = match.groups()
+    book_index = BOOKS.index(book)
+    start_chapter, start_verse = int(start_chapter), int(start_verse)
+
+    if end_verse is None:
+        # A single verse (C:V) or a single word of a verse (C:V.W)
+        end_chapter, end_verse = start_chapter, start_verse
+        end_word = start_word
+    else:
+        end_chapter = int(end_chapter) if end_chapter is not None else start_chapter
+        end_verse = int(end_verse)
+
+    start = _position(book_index, start_chapter, start_verse, int(start_word) if start_word else 0)
+    end = _position(book_index, end_chapter, end_verse, int(end_word) if end_word else LAST_WORD)
+    if start is None or end is None or end < start:
+        return None
+    return start, end
+
+
+def read_excerpts(file_paths):
+    """
+    (book, range, source) for every excerpt of the DHSpecification.<Book>.xml files, in file order.
+    """
+    excerpts = []
+    for file_path in file_paths:
+        book = os.path.basename(file_path).split('.')[1]  # Extract book name
+        root = ET.parse(file_path).getroot()
+        for excerpt in root.findall(".//excerpt"):
+            excerpts.append((book, excerpt.find("range").text.strip(), excerpt.find("source").text.strip()))
+    return excerpts
+
+
+class SourceIntervals:
+    """
+    Intervals sorted by start position, with the source code of each one and the running maximum of
+    their ends, so that intervals may overlap and still be found with binary search.
+    """
+
+    def __init__(self, starts, ends, sources, order, names):
+        # An index cached before out of order ranges were skipped may still have some
+        valid = ends >= starts
+        self.starts = starts[valid]
+        self.ends = ends[valid]
+        self.sources = sources[valid]
+        self.order = order[valid]  # Position of the excerpt in the DH files, to break ties between sources
+        self.names = names
+        self.max_ends = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+
+    @classmethod
+    def from_excerpts(cls, excerpts):
+        rows = []
+        for order, (book, verse_range, source) in enumerate(excerpts):
+            positions = parse_range(book, verse_range)
+            if positions is None:
+                print(f"Skipping a range that can't be read or is out of order: {book} {verse_range}")
+                continue
+            rows.append((positions[0], positions[1], source, order))
+
+        intervals = pd.DataFrame(rows, columns=["start", "end", "source", "order"]).sort_values(["start", "order"])
+        codes, names = pd.factorize(intervals["source"])
+        return cls(intervals["start"].to_numpy(np.int64), intervals["end"].to_numpy(np.int64),
+                   codes.astype(np.int16), intervals["order"].to_numpy(np.int32), list(names))
+
+    def overlapping(self, first, last):
+        """
+        Indices of the intervals that overlap the positions first..last.
+        """
+        # Intervals starting after `last` can't overlap, and before the first interval whose running
+        # maximum end reaches `first` none do
+        low = np.searchsorted(self.max_ends, first, side="left")
+        high = np.searchsorted(self.starts, last, side="right")
+        candidates = np.arange(low, high)
+        return candidates[self.ends[candidates] >= first]
+
+    def sources_at(self, verse_id, word=None):
+        """
+        Names of the sources of a verse, or of one word of it.
+        """
+        if word is None:
+            first, last = verse_id * WORD_SLOTS, verse_id * WORD_SLOTS + LAST_WORD
+        else:
+            first = last = verse_id * WORD_SLOTS + word
+        found = self.overlapping(first, last)
+        return [self.names[self.sources[i]] for i in found[np.argsort(self.order[found])]]
+
+    def verse_pieces(self):
+        """
+        Every (verse, interval) pair as a table, with the first and last word of the verse that the interval covers.
+        """
+        first_verse = self.starts // WORD_SLOTS
+        last_verse = self.ends // WORD_SLOTS
+        counts = last_verse - first_verse + 1
+
+        interval = np.repeat(np.arange(len(self.starts)), counts)
+        verse = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first_verse[interval]
+
+        first_word = np.where(verse == first_verse[interval], self.starts[interval] % WORD_SLOTS, 0)
+        last_word = np.where(verse == last_verse[interval], self.ends[interval] % WORD_SLOTS, LAST_WORD)
+        return pd.DataFrame({"verse": verse, "source": self.sources[interval], "order": self.order[interval],
+                             "first_word": first_word, "last_word": last_word})
+
+    def source_shares(self, word_counts=None):
+        """
+        A (verse, source) matrix with the share of each verse that belongs to each source; the rows of
+        verses without a source are all zero. With word_counts (the number of words in every verse, by
+        verse id) the shares follow the word spans; without it, the sources of a split verse share it equally.
+        A verse whose word count is 0 (unknown), or whose ranges cover none of its words, is shared equally too.
+        """
+        pieces = self.verse_pieces()
+        pieces["size"] = 1.0
+        if word_counts is not None:
+            counts = np.asarray(word_counts)[pieces["verse"]]
+            first = np.maximum(pieces["first_word"], 1)
+            last = np.minimum(pieces["last_word"], counts)
+            spans = np.maximum(last - first + 1, 0)
+            covered = pd.Series(spans).groupby(pieces["verse"].to_numpy()).transform("sum").to_numpy() > 0
+            pieces["size"] = np.where(covered, spans, 1.0)
+
+        sizes = pieces.groupby(["verse", "source"])["size"].sum()
+        totals = sizes.groupby(level="verse").transform("sum")
+        shares = (sizes / totals.where(totals > 0, 1)).reset_index(name="share")
+
+        matrix = np.zeros((VERSE_COUNT, len(self.names)), dtype=np.float32)
+        matrix[shares["verse"], shares["source"]] = shares["share"]
+        return matrix
+
+    def primary_sources(self, word_counts=None):
+        """
+        The source code of every verse with the largest share, ties going to the source listed
+        first in the DH files; -1 for verses without a source.
+        """
+        shares = self.source_shares(word_counts)
+        pieces = self.verse_pieces()
+        first_order = pieces.groupby(["verse", "source"])["order"].min().reset_index()
+        first_order["share"] = shares[first_order["verse"], first_order["source"]]
+
+        best = first_order.sort_values(["verse", "share", "order"], ascending=[True, False, True])
+        best = best.drop_duplicates("verse")
+
+        primary = np.full(VERSE_COUNT, -1, dtype=np.int16)
+        primary[best["verse"]] = best["source"]
+        return primary
+
+    def save(self, cache_path, signature):
+        np.savez(cache_path, starts=self.starts, ends=self.ends, sources=self.sources, order=self.order,
+                 names=np.array(self.names, dtype=str), signature=np.array(signature))
+
+    @classmethod
+    def load(cls, cache_path):
+        with np.load(cache_path, allow_pickle=False) as cache:
+            return cls(cache["starts"], cache["ends"], cache["sources"], cache["order"], cache["names"].tolist())
+
+
+def files_signature(file_paths):
+    # A hash of the content of all the DH files
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        with open(file_path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_source_intervals(file_paths, cache_path=INDEX_CACHE, excerpt_reader=read_excerpts, signature=None):
+    """
+    The interval index of the DH files, built once and kept in cache_path until the files change.
+    excerpt_reader(file_paths) reads the excerpts when the index has to be built (dh_loader.cached_excerpts
+    reads them from its cache), and signature, when given, is used instead of hashing the files again.
+    """
+    signature = signature or files_signature(file_paths)
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as cache:
+            cached_signature = str(cache["signature"])
+        if cached_signature == signature:
+            return SourceIntervals.load(cache_path)
+
+    intervals = SourceIntervals.from_excerpts(excerpt_reader(file_paths))
+    intervals.save(cache_path, signature)
+    return intervals
+
+
+def save_source_shares(shares, names, shares_path=SHARES_PATH):
+    np.savez(shares_path, shares=shares, names=np.array(names, dtype=str))
+
+
+def load_source_shares(shares_path=SHARES_PATH):
+    """
+    The (verse id, source) share matrix saved by books_to_sources.py, and the source names of its columns.
+    """
+    with np.load(shares_path, allow_pickle=False) as saved:
+        return saved["shares"], saved["names"].tolist()
@@ -0,0 +1,205 @@
+import argparse
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from corpus_table import read_table
+from dependency_metrics import COLUMNS as DEPENDENCY_COLUMNS, store_dependency_metrics
+from dicta_store import load_store
+from excel_stream import write_frames
+from teamim_clause_engine import load_clauses
+from teamim_tree_store import load_trees
+from verse_metrics import child_words, load_verse_metrics, word_frequencies
+from verse_registry import BOOKS, book_indices, source_names, verse_ids
+
+"""The statistics of the corpus for any grouping of the verses.
+Every input is read once into a verse level table (the SHEBANQ text metrics, the teamim trees and
+clauses, the dependency trees of the dicta store, and the phrases of the clauses table), and every table
+has the same Book, Chapter, Verse, Verse ID and Source columns, the sources coming from the verse registry.
+A report is then one groupby-aggregate per metric over these tables, by any of their columns: the
+book, the source, the chapter, book x source, or any other list of columns."""
+
+# Named groupings; a chapter is always within its book
+GROUPINGS = {
+    "book": ["Book"],
+    "source": ["Source"],
+    "chapter": ["Book", "Chapter"],
+    "book_source": ["Book", "Source"],
+}
+
+UNKNOWN = "Unknown"
+
+
+def grouping_columns(by):
+    # The columns of a grouping name, a column or a list of columns
+    if isinstance(by, str):
+        return GROUPINGS.get(by, [by])
+    return list(by)
+
+
+def verse_columns(books, chapters, verses):
+    """
+    The Book, Chapter, Verse, Verse ID and Source columns of verses given by their book (as a name,
+    abbreviation or number), chapter and verse. Books keep the order of BOOKS; unknown ones are "Unknown".
+    """
+    book_index = book_indices(books)
+    chapters = pd.to_numeric(pd.Series(np.asarray(chapters)), errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+    verses = pd.to_numeric(pd.Series(np.asarray(verses)), errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+    ids = verse_ids(book_index, chapters, verses)
+    return {
+        "Book": pd.Categorical.from_codes(np.where(book_index >= 0, book_index, len(BOOKS)), BOOKS + [UNKNOWN]),
+        "Chapter": chapters,
+        "Verse": verses,
+        "Verse ID": ids,
+        "Source": source_names(ids, unknown=UNKNOWN),
+    }
+
+
+class StatisticsEngine:
+    """
+    The verse level tables, each one loaded on first use and shared by all the reports.
+    """
+
+    def __init__(self, store_dir="dicta_store", phrases_table="clauses_structure"):
+        self.store_dir = store_dir
+        self.phrases_table = phrases_table
+
+    @cached_property
+    def _text_metrics(self):
+        metrics, vocabulary = load_verse_metrics()
+        metrics = metrics.assign(**verse_columns(metrics["Book"].astype(str), metrics["Chapter"], metrics["Verse"]))
+        return metrics, vocabulary
+
+    @property
+    def text(self):
+        # The verse metrics of verse_metrics.py: word counts, word lengths and token ids of every verse
+        return self._text_metrics[0]
+
+    @property
+    def vocabulary(self):
+        # The words of the token ids of text
+        return self._text_metrics[1]
+
+    @cached_property
+    def teamim_trees(self):
+        # Depth, node count and largest fan-out of every teamim tree
+        trees = load_trees()
+        metrics = trees.tree_metrics()[["Depth", "Node Count", "Max Fan-out"]]
+        return metrics.assign(**verse_columns(trees.verse_book, trees.verse_chapter, trees.verse_number))
+
+    @cached_property
+    def teamim_clauses(self):
+        # Number of teamim clauses of every verse
+        teamim, clauses = load_clauses()
+        return pd.DataFrame({"Clause Count": clauses.clause_counts(),
+                             **verse_columns(teamim.verse_book, teamim.verse_chapter, teamim.verse_number)})
+
+    @cached_property
+    def dependency(self):
+        # The dependency tree metrics of every verse of the dicta store that has tokens
+        store = load_store(self.store_dir)
+        metrics = store_dependency_metrics(store)
+        metrics = metrics.assign(**verse_columns(store.verse_book, store.verse_chapter, store.verse_number))
+        return metrics[np.diff(store.verse_offsets) > 0].reset_index(drop=True)
+
+    @cached_property
+    def phrases(self):
+        # Every phrase of the clauses table, with its sentence and clause
+        df = read_table(self.phrases_table, columns=["Book", "Chapter", "Verse", "Sentence ID", "Clause ID",
+                                                     "Function", "Phrase Type"])
+        return df.assign(**verse_columns(df["Book"].astype(str), df["Chapter"], df["Verse"]))
+
+    def verse_words(self, by):
+        """
+        The text table with the words of the grouping `by`. statistics_by_books.py counted every w element
+        inside a verse and statistics_by_sources.py only the w children of the verse, so a grouping with
+        the Source column takes the words of the w children (see verse_metrics.py).
+        """
+        return child_words(self.text) if "Source" in grouping_columns(by) else self.text
+
+    def word_frequencies(self, by, drop_unknown=True):
+        # Word, Frequency of every group, words in order of first appearance
+        by = grouping_columns(by)
+        return word_frequencies(_known(self.verse_words(by), by, drop_unknown), self.vocabulary, by=by)
+
+    def group_statistics(self, by, drop_unknown=True):
+        """
+        Every metric aggregated by the grouping `by`, as a dict of table name to a table with one row per group.
+        With drop_unknown, the verses of an unknown book or source are left out.
+        """
+        by = grouping_columns(by)
+
+        def averages(table, columns, names=None):
+            grouped = _known(table, by, drop_unknown).groupby(by, observed=True)
+            result = grouped[columns].mean()
+            result.columns = names or [column if column.startswith("Average") else f"Average {column}" for column in columns]
+            result.insert(0, "Verses", grouped.size())
+            return result.reset_index()
+
+        text = _known(self.verse_words(by), by, drop_unknown)
+        word_lengths = text.groupby(by, observed=True)[["Word Length Sum", "Total Words"]].sum()
+        word_lengths = (word_lengths["Word Length Sum"] / word_lengths["Total Words"].where(word_lengths["Total Words"] > 0))
+
+        frequencies = self.word_frequencies(by, drop_unknown)
+        vocabulary = frequencies.groupby(by, observed=True).agg(Total_Words=("Frequency", "sum"),
+                                                                Unique_Words=("Word", "size"))
+        vocabulary["Unique_Words_Percentage"] = vocabulary["Unique_Words"] / vocabulary["Total_Words"] * 100
+
+        # Clauses of the clauses table, counted within every sentence
+        phrases = _known(self.phrases, by, drop_unknown)
+        sentence_clauses = phrases.groupby(by + ["Sentence ID"], observed=True)["Clause ID"].nunique()
+
+        return {
+            "Verse Lengths": averages(text, ["Total Words", "Word Elements"], ["Average Verse Length", "Average Word Elements"]),
+            "Word Lengths": word_lengths.reset_index(name="Average Word Length"),
+            "Unique Words": averages(text, ["Total Words", "Unique Words"]),
+            "Vocabulary": vocabulary.reset_index(),
+            "Teamim Trees": averages(self.teamim_trees, ["Depth", "Node Count", "Max Fan-out"]),
+            "Teamim Clauses": averages(self.teamim_clauses, ["Clause Count"], ["Average Clauses per Verse"]),
+            "Syntax Clauses": sentence_clauses.groupby(by, observed=True).mean().reset_index(name="Average Clauses per Sentence"),
+            "Dependency Trees": averages(self.dependency, DEPENDENCY_COLUMNS),
+            "Function Frequencies": _frequencies(phrases, by, "Function"),
+            "Phrase Type Frequencies": _frequencies(phrases, by, "Phrase Type"),
+        }
+
+    def write_report(self, by, output_excel=None, drop_unknown=True):
+        """
+        Write the statistics of the grouping `by` to an Excel file with a sheet per table.
+        """
+        name = by if isinstance(by, str) else "_".join(grouping_columns(by)).lower()
+        output_excel = output_excel or f"statistics/statistics_by_{name}.xlsx"
+        statistics = self.group_statistics(by, drop_unknown)
+        write_frames(output_excel, statistics, index=False)
+        return statistics
+
+
+def _known(table, by, drop_unknown=True):
+    # The rows whose book and source (among the columns of by) are known
+    if not drop_unknown:
+        return table
+    known = np.ones(len(table), dtype=bool)
+    for column in ("Book", "Source"):
+        if column in by:
+            known &= (table[column] != UNKNOWN).to_numpy()
+    return table[known]
+
+
+def _frequencies(table, by, column):
+    # Number of rows of every value of column in every group
+    return table.pivot_table(index=by, columns=column, aggfunc="size", fill_value=0, observed=True).reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the statistics of the corpus for groupings of the verses")
+    parser.add_argument("--by", nargs="+", default=["book", "source"],
+                        help=f"groupings ({', '.join(GROUPINGS)}) or columns; a+b groups by both columns")
+    args = parser.parse_args()
+
+    engine = StatisticsEngine()
+    for by in args.by:
+        grouping = by if by in GROUPINGS else by.split("+")
+        statistics = engine.write_report(grouping)
+        for table_name, table in statistics.items():
+            print(f"\n{table_name} by {by}:")
+            print(table)
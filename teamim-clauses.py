@@ -1,8 +1,8 @@
+import argparse
 import pandas as pd
-from openpyxl import load_workbook
+from teamim_codes import load_teamim_codes
+from teamim_clause_engine import load_clauses
 
-taamim_map = load_workbook('Teamim.xlsx')
-sheet = taamim_map.active
 data_dict = {}
 
 # Define punctuation marks (Teamim) used to identify clause boundaries
@@ -30,44 +30,36 @@ def build_clauses(verse):
     return clauses
 
 def teamimTree():
-    # Reads the Excel file and maps each verse to its corresponding Teamim clauses.
-
-    for row in sheet.iter_rows(values_only=True): 
-        key = row[1]  # Extract verse key
-        book = key[1:3]  # Extract book identifier
-        
-        # Mapping biblical book abbreviations to numbers
-        book_map = {'gn': '0', 'ex': '1', 'lv': '2', 'nu': '3', 'dt': '4'}
-        
-        book = book_map.get(book)
-        if book is None:
-            continue  
-        
-        # Extract chapter and verse number
-        chapter_pasuk = key[3:len(key)].split(':')
-        chapter = chapter_pasuk[0]
-        pasuk = chapter_pasuk[1].split(" ")[0]
-        
-        # Process Teamim values
-        value = row[2]
-        value = str.split(value, "/")
-        value[0] = value[0].removeprefix(" ")
-        
+    # Maps each verse to its corresponding Teamim clauses with build_clauses, from the teamim codes of Teamim.xlsx
+    # (read once and cached by teamim_codes.py).
+
+    teamim = load_teamim_codes()
+    for i, key in enumerate(teamim.verse_keys()):
         # Store the parsed clauses in the dictionary
-        data_dict[f"{book}:{chapter}:{pasuk}"] = build_clauses(value)
+        data_dict[key] = build_clauses(teamim.verse_strings(i))
 
     return data_dict
 
-def print_clauses_to_txt():
-    # Writes the extracted clauses into a text file
+def print_clauses_to_txt(teamim, clauses):
+    # Writes the clauses, segmented by teamim_clause_engine.py, into a text file
 
     with open('teamim-clauses.txt', 'w', encoding='utf-8') as f:
-        for key, clauses in data_dict.items():
-            f.write(f"verse: {key}:\n")
-            for i, clause in enumerate(clauses):
-                f.write(f"  {i}. {' '.join(clause)}\n")
-            f.write("\n")
-
-# Generate the clause mapping and save the output
-data_dict = teamimTree()
-print_clauses_to_txt()
+        clauses.render_text(f, [f"verse: {key}:" for key in teamim.verse_keys()])
+
+parser = argparse.ArgumentParser(description="Split all the verses into clauses by their teamim")
+parser.add_argument("--text", action="store_true", help="also write the clauses to teamim-clauses.txt")
+parser.add_argument("--parity", action="store_true", help="check the segmentation against build_clauses")
+args = parser.parse_args()
+
+# Segment all the verses at once
+teamim, clauses = load_clauses()
+print(f"{len(clauses.clause_lengths())} clauses in {len(clauses)} verses")
+
+if args.parity:
+    data_dict = teamimTree()
+    different = [key for i, (key, verse_clauses) in enumerate(data_dict.items())
+                 if clauses.verse_clauses(i) != verse_clauses]
+    print(f"{len(different)} verses differ from build_clauses" + (f": {different[:10]}" if different else ""))
+
+if args.text:
+    print_clauses_to_txt(teamim, clauses)
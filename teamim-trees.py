@@ -1,11 +1,12 @@
+import argparse
 import pandas as pd
 import numpy as np
-from anytree import Node, RenderTree
+from anytree import Node
 import xml.etree.ElementTree as ET
-from openpyxl import load_workbook
+from teamim_codes import load_teamim_codes
+from teamim_tree_store import TREES_PATH, TeamimTrees, save_trees, load_trees
+from teamim_tree_engine import LEVELS, SHLISE_LEVELS, build_trees, check_parity
 
-taamim_map = load_workbook('Teamim.xlsx')
-sheet = taamim_map.active
 data_dict = {}
 
 # Define Teamim categories based on their role in the sentence structure
@@ -72,44 +73,40 @@ def build_the_tree(verse):
     return root
 
 def teamimTree():
-# Parses the Excel file and constructs trees for each verse.
+# Constructs anytree trees for each verse, from the teamim codes of Teamim.xlsx (see teamim_codes.py).
 
-    for row in sheet.iter_rows(values_only=True): 
-        key = row[1]
-        book = key[1:3]
-        
-        # Map book abbreviations to numerical identifiers
-        book_map = {'gn': '0', 'ex': '1', 'lv': '2', 'nu': '3', 'dt': '4'}
-        book = book_map.get(book)
-        if book is None:
-            continue  
-
-        # Extract chapter and verse numbers
-        chapter_pasuk = key[3:].split(':')
-        chapter = chapter_pasuk[0]
-        pasuk = chapter_pasuk[1].split(" ")[0]
-        
-        # Process the Teamim sequence
-        value = row[2]
-        value = value.split("/")
-        value[0] = value[0].strip()  
-        
+    teamim = load_teamim_codes()
+    for i, key in enumerate(teamim.verse_keys()):
         # Store the tree structure in the dictionary
-        data_dict[f"{book}:{chapter}:{pasuk}"] = build_the_tree(value)
+        data_dict[key] = build_the_tree(teamim.verse_strings(i))
 
     return data_dict
 
-def print_tree(tree, file):
-    # Prints the hierarchical tree structure to a text file.
-    
-    for pre, _, node in RenderTree(tree):
-        file.write(f"{pre}{node.name}\n")
+parser = argparse.ArgumentParser(description="Build the teamim trees of all the verses")
+parser.add_argument("--text", action="store_true", help="also write the RenderTree view to teamim-trees.txt")
+parser.add_argument("--anytree", action="store_true", help="build the trees with build_the_tree instead of teamim_tree_engine.py")
+parser.add_argument("--parity", action="store_true",
+                    help="check that the array engine, with the levels of build_the_tree, builds the same trees as build_the_tree")
+parser.add_argument("--shlise-level", action="store_true",
+                    help="give the Shlise codes a level of their own below Meshne, instead of the levels of build_the_tree")
+args = parser.parse_args()
+
+if args.parity:
+    reference_path = "teamim-trees.anytree.npz"
+    save_trees(teamimTree(), reference_path)
+    different = check_parity(build_trees(levels=LEVELS), TeamimTrees(reference_path))
+    print(f"{len(different)} trees differ from build_the_tree" + (f": {different[:10]}" if different else ""))
 
-# Generate trees for all verses
-trees = teamimTree()
+# Generate trees for all verses and save them as parent-index arrays
+if args.anytree:
+    trees = teamimTree()
+    save_trees(trees, TREES_PATH)
+else:
+    trees = build_trees(levels=SHLISE_LEVELS if args.shlise_level else LEVELS)
+    trees.save(TREES_PATH)
+print(f"Saved {len(trees)} trees to {TREES_PATH}")
 
-# Save the tree structures to a text file
-with open("teamim-trees.txt", "w", encoding="utf-8") as file:
-    for key, tree in trees.items():
-        file.write(f"\nP: {key}\n")  
-        print_tree(tree, file)
+# The text view of the trees, for reading
+if args.text:
+    with open("teamim-trees.txt", "w", encoding="utf-8") as file:
+        load_trees(TREES_PATH).render_text(file)
@@ -0,0 +1,106 @@
+import numpy as np
+
+from teamim_codes import load_teamim_codes
+
+"""Clause segmentation of all the verses at once.
+A clause is a run of King codes closed by a Ceaser code (which is part of the clause) or by the end of
+the verse; a Ceaser with no King before it doesn't make a clause, and the other codes are skipped.
+The segmentation works on the flat code array of teamim_codes.py with masks and cumulative sums: the
+kept codes are split into runs after every Ceaser and at every verse start, and the runs with a King are
+the clauses. The result is the codes of the clauses with clause offsets, and the clauses of every verse
+with verse offsets, CSR style, so the number of clauses of every verse is a difference of offsets."""
+
+# Define punctuation marks (Teamim) used to identify clause boundaries
+CEASER = ['00', '92']  # Clause-ending Taamim
+KING = ['01', '65', '73', '80', '85']  # Clause-continuing Teamim
+
+
+def _code_mask(codes, members):
+    # Which codes (uint8, "-" and combined codes included as NON_CODE) are in the list of two-digit codes
+    table = np.zeros(256, dtype=bool)
+    table[[int(code) for code in members]] = True
+    return table[codes]
+
+
+class TeamimClauses:
+    """
+    The codes of clause j are codes[clause_offsets[j]:clause_offsets[j + 1]], and the clauses of verse i
+    are verse_clause_offsets[i]:verse_clause_offsets[i + 1].
+    """
+
+    def __init__(self, codes, clause_offsets, verse_clause_offsets):
+        self.codes = codes
+        self.clause_offsets = clause_offsets
+        self.verse_clause_offsets = verse_clause_offsets
+
+    def __len__(self):
+        return len(self.verse_clause_offsets) - 1
+
+    def clause_counts(self):
+        # Number of clauses of every verse
+        return np.diff(self.verse_clause_offsets)
+
+    def clause_lengths(self):
+        return np.diff(self.clause_offsets)
+
+    def verse_clauses(self, i):
+        # The clauses of verse i as lists of two-digit codes
+        clauses = range(self.verse_clause_offsets[i], self.verse_clause_offsets[i + 1])
+        return [[f"{code:02d}" for code in self.codes[self.clause_offsets[j]:self.clause_offsets[j + 1]]]
+                for j in clauses]
+
+    def render_text(self, file, headers):
+        """
+        Write the clauses of every verse, numbered, after its header line (such as "verse: <key>:").
+        """
+        for i, header in enumerate(headers):
+            file.write(f"{header}\n")
+            for j, clause in enumerate(self.verse_clauses(i)):
+                file.write(f"  {j}. {' '.join(clause)}\n")
+            file.write("\n")
+
+
+def segment_clauses(codes, verse_offsets, ceaser=CEASER, king=KING):
+    """
+    Split the verses (codes[verse_offsets[i]:verse_offsets[i + 1]]) into clauses.
+    """
+    codes = np.asarray(codes)
+    verse_offsets = np.asarray(verse_offsets)
+    is_ceaser = _code_mask(codes, ceaser)
+    is_king = _code_mask(codes, king)
+
+    # Only the Ceaser and King codes take part, with the verse offsets moved to the kept codes
+    kept = is_ceaser | is_king
+    kept_offsets = np.concatenate([[0], np.cumsum(kept)])[verse_offsets]
+    kept_codes = codes[kept]
+    is_ceaser = is_ceaser[kept]
+    is_king = is_king[kept]
+
+    # A run starts at every verse start and after every Ceaser
+    run_start = np.zeros(len(kept_codes), dtype=bool)
+    run_start[1:] = is_ceaser[:-1]
+    verse_starts = kept_offsets[:-1][kept_offsets[:-1] < len(kept_codes)]
+    run_start[verse_starts] = True
+    run = np.cumsum(run_start) - 1
+
+    # The runs with a King are the clauses
+    kings_per_run = np.bincount(run[is_king], minlength=run[-1] + 1 if len(run) else 0)
+    in_clause = kings_per_run[run] > 0
+    clause_start = run_start & in_clause
+    clause_codes = kept_codes[in_clause]
+    clause_offsets = np.append(np.flatnonzero(clause_start[in_clause]), len(clause_codes))
+
+    # The clauses of every verse: the clause starts before each verse start
+    clauses_before = np.concatenate([[0], np.cumsum(clause_start)])
+    verse_clause_offsets = clauses_before[kept_offsets]
+
+    return TeamimClauses(clause_codes, clause_offsets.astype(np.int32), verse_clause_offsets.astype(np.int32))
+
+
+def load_clauses(teamim=None):
+    """
+    The clauses of all the verses of Teamim.xlsx (teamim is a teamim_codes.TeamimCodes, loaded when None),
+    with the teamim they were segmented from.
+    """
+    teamim = teamim if teamim is not None else load_teamim_codes()
+    return teamim, segment_clauses(teamim.codes, teamim.verse_offsets)
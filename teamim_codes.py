@@ -0,0 +1,111 @@
+import os
+import re
+
+import numpy as np
+from openpyxl import load_workbook
+
+from verse_registry import BOOK_CODES, verse_ids
+
+"""The teamim of Teamim.xlsx as flat arrays.
+The sheet is streamed once in read-only mode. Every code of every verse becomes one uint8 in a flat
+codes array ("73" is 73), with verse_offsets marking where each verse starts, CSR style, and the verse
+keys are parsed once into book, chapter and verse numbers and registry ids. The arrays are cached in
+teamim_codes.npz and rebuilt only when the workbook changes."""
+
+TEAMIM_XLSX = "Teamim.xlsx"
+TEAMIM_CACHE = "teamim_codes.npz"
+
+# Code of the entries that aren't a single two-digit code: "-" and combinations such as "70+05"
+NON_CODE = 255
+
+# Keys such as " gn1:1 " in the second column of the sheet
+KEY_PATTERN = re.compile(r"^\s*([a-z]{2})(\d+):(\d+)")
+CODE_PATTERN = re.compile(r"^\d\d$")
+
+
+def read_teamim(xlsx_path=TEAMIM_XLSX):
+    """
+    Stream the sheet and return the verse arrays (book, chapter and verse numbers), the verse offsets
+    and the codes, for the verses of the five books in the order of the sheet.
+    """
+    workbook = load_workbook(xlsx_path, read_only=True)
+    books, chapters, verses, offsets, codes = [], [], [], [0], []
+    try:
+        for key, value in workbook.active.iter_rows(min_col=2, max_col=3, values_only=True):
+            match = KEY_PATTERN.match(key or "")
+            if match is None or match.group(1) not in BOOK_CODES:
+                continue
+
+            book, chapter, verse = match.groups()
+            books.append(BOOK_CODES[book])
+            chapters.append(int(chapter))
+            verses.append(int(verse))
+
+            # "73/74/-/92/" -> 73, 74, NON_CODE, 92; the empty entry after the last "/" is dropped
+            for entry in (value or "").split("/"):
+                entry = entry.strip()
+                if entry:
+                    codes.append(int(entry) if CODE_PATTERN.match(entry) else NON_CODE)
+            offsets.append(len(codes))
+    finally:
+        workbook.close()
+
+    return {
+        "verse_book": np.array(books, dtype=np.int8),
+        "verse_chapter": np.array(chapters, dtype=np.int16),
+        "verse_number": np.array(verses, dtype=np.int16),
+        "verse_offsets": np.array(offsets, dtype=np.int32),
+        "codes": np.array(codes, dtype=np.uint8),
+    }
+
+
+class TeamimCodes:
+    """
+    The codes of verse i are codes[verse_offsets[i]:verse_offsets[i + 1]].
+    """
+
+    def __init__(self, arrays):
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        # Registry ids of the verses (-1 for a verse that isn't in the registry, such as gn35:30)
+        self.verse_ids = verse_ids(self.verse_book, self.verse_chapter, self.verse_number)
+
+    def __len__(self):
+        return len(self.verse_book)
+
+    def verse_keys(self):
+        # "book:chapter:verse" keys, with the book numbers of the teamim files
+        return [f"{book}:{chapter}:{verse}" for book, chapter, verse in
+                zip(self.verse_book, self.verse_chapter, self.verse_number)]
+
+    def verse_codes(self, i):
+        return self.codes[self.verse_offsets[i]:self.verse_offsets[i + 1]]
+
+    def verse_strings(self, i):
+        # The codes of a verse as the two-digit strings of the sheet, "-" for NON_CODE
+        return ["-" if code == NON_CODE else f"{code:02d}" for code in self.verse_codes(i)]
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def load_teamim_codes(xlsx_path=TEAMIM_XLSX, cache_path=TEAMIM_CACHE):
+    """
+    The teamim of all the verses, from the cache while the workbook hasn't changed.
+    """
+    signature = _file_signature(xlsx_path)
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as cache:
+            if np.array_equal(cache["signature"], signature):
+                return TeamimCodes({name: cache[name] for name in cache.files if name != "signature"})
+
+    arrays = read_teamim(xlsx_path)
+    np.savez(cache_path, signature=signature, **arrays)
+    return TeamimCodes(arrays)
+
+
+if __name__ == "__main__":
+    teamim = load_teamim_codes()
+    print(f"{len(teamim)} verses, {len(teamim.codes)} codes")
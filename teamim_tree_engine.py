@@ -0,0 +1,196 @@
+import time
+
+import numpy as np
+
+from teamim_codes import load_teamim_codes
+from teamim_tree_store import TREES_PATH, save_tree_arrays
+
+"""Array engine for the teamim trees.
+The hierarchy is a table of levels, the highest first, compiled into a lookup array of the 100 codes
+(0 for a code that isn't in any level), so every code is classified with one indexing operation.
+Every verse is built with one linear scan: a node of level l takes the pending nodes of level l + 1 as
+its children, the nodes of the first level are children of the root, and the nodes that are still
+pending at the end of the verse go to the root. The trees come out as the label codes and parent indices
+of teamim_tree_store.py, and the depth, fan-out and level histograms are counted while they are built."""
+
+# Define Teamim categories based on their role in the sentence structure
+CEASER = ['00', '92']  # Major separators
+KING = ['01', '65', '73', '80', '85']  # High-level connectors
+MESHNE = ['02', '03', '10', '88', '91']  # Secondary-level connectors
+SHLISE = ['14', '61', '62', '83', '84', '98']  # Third-level connectors
+
+# The levels of build_the_tree in teamim-trees.py, where a duplicated branch makes every Shlise code a Meshne.
+# They are the default, so the trees and everything computed from them stay those of build_the_tree
+LEVELS = [CEASER, KING, MESHNE + SHLISE]
+
+# Shlise as a level of its own, below Meshne (teamim-trees.py --shlise-level)
+SHLISE_LEVELS = [CEASER, KING, MESHNE, SHLISE]
+
+# Label code of the root (the teamim codes are 0-99)
+ROOT = 100
+
+
+def compile_levels(levels=LEVELS):
+    # Level of every code, 1 for the first list of levels
+    table = np.zeros(100, dtype=np.uint8)
+    for level, codes in enumerate(levels, start=1):
+        table[[int(code) for code in codes]] = level
+    return table
+
+
+class TreeArrays:
+    """
+    Trees of all the verses in the format of teamim_tree_store.py: the nodes of verse i are
+    verse_offsets[i]:verse_offsets[i + 1] in preorder, root first, with their label codes (ROOT for the root)
+    and the index of their parent within the verse (-1 for the root).
+    Built along with them:
+        depths: depth of every tree
+        fan_outs: largest number of children of a node of every tree
+        depth_histogram, fan_out_histogram: number of nodes of every depth and number of children
+        level_counts: number of nodes of every level in every verse (column 0 is the root)
+    """
+
+    def __init__(self, teamim, verse_offsets, labels, parents, depths, fan_outs,
+                 depth_histogram, fan_out_histogram, level_counts):
+        self.teamim = teamim
+        self.verse_offsets = verse_offsets
+        self.labels = labels
+        self.parents = parents
+        self.depths = depths
+        self.fan_outs = fan_outs
+        self.depth_histogram = depth_histogram
+        self.fan_out_histogram = fan_out_histogram
+        self.level_counts = level_counts
+
+    def __len__(self):
+        return len(self.depths)
+
+    def label_strings(self):
+        # The labels as in the anytree trees: "root" and the two-digit codes
+        names = np.array([f"{code:02d}" for code in range(100)] + ["root"])
+        return names[self.labels]
+
+    def save(self, trees_path=TREES_PATH):
+        label_names, label_ids = np.unique(self.label_strings(), return_inverse=True)
+        save_tree_arrays(trees_path, self.teamim.verse_book, self.teamim.verse_chapter, self.teamim.verse_number,
+                         self.verse_offsets, label_names, label_ids, self.parents)
+
+
+def build_trees(teamim=None, levels=LEVELS):
+    """
+    Build the trees of all the verses of teamim (a teamim_codes.TeamimCodes, loaded when None)
+    with the hierarchy levels.
+    """
+    teamim = teamim if teamim is not None else load_teamim_codes()
+    level_count = len(levels)
+
+    # The level of every code of every verse at once; "-" and combined codes (NON_CODE) are skipped
+    code_levels = np.where(teamim.codes < 100, compile_levels(levels)[np.minimum(teamim.codes, 99)], 0)
+    kept = code_levels > 0
+    kept_offsets = np.concatenate([[0], np.cumsum(kept)])[teamim.verse_offsets].tolist()
+    codes = teamim.codes[kept].tolist()
+    code_levels = code_levels[kept].tolist()
+
+    labels, parents = [], []
+    verse_offsets = [0]
+    depths, fan_outs = [], []
+    depth_histogram, fan_out_histogram = {}, {}
+    level_counts = np.zeros((len(teamim), level_count + 1), dtype=np.int32)
+
+    for verse, (start, end) in enumerate(zip(kept_offsets[:-1], kept_offsets[1:])):
+        # Nodes in the order of the codes, node 0 being the root. Children are listed in the order they are attached.
+        children = [[]]
+        node_levels = [0]
+        pending = [[] for _ in range(level_count + 2)]
+
+        for level in code_levels[start:end]:
+            node = len(node_levels)
+            node_levels.append(level)
+            children.append([])
+
+            # The pending nodes of the level below, the last one first
+            below = pending[level + 1]
+            while below:
+                children[node].append(below.pop())
+            if level == 1:
+                children[0].append(node)
+            else:
+                pending[level].append(node)
+
+        for level in range(2, level_count + 1):
+            children[0].extend(pending[level])
+
+        # Preorder, with the parent (in preorder) and depth of every node
+        verse_codes = [ROOT] + codes[start:end]
+        order = []
+        verse_depth = verse_fan_out = 0
+        stack = [(0, -1, 0)]
+        while stack:
+            node, parent, depth = stack.pop()
+            order.append(node)
+            parents.append(parent)
+            labels.append(verse_codes[node])
+            depth_histogram[depth] = depth_histogram.get(depth, 0) + 1
+            fan_out = len(children[node])
+            fan_out_histogram[fan_out] = fan_out_histogram.get(fan_out, 0) + 1
+            verse_depth = max(verse_depth, depth)
+            verse_fan_out = max(verse_fan_out, fan_out)
+
+            position = len(order) - 1
+            for child in reversed(children[node]):
+                stack.append((child, position, depth + 1))
+
+        level_counts[verse] = np.bincount(node_levels, minlength=level_count + 1)
+        depths.append(verse_depth)
+        fan_outs.append(verse_fan_out)
+        verse_offsets.append(len(labels))
+
+    return TreeArrays(
+        teamim,
+        np.array(verse_offsets, dtype=np.int32),
+        np.array(labels, dtype=np.uint8),
+        np.array(parents, dtype=np.int8),
+        np.array(depths, dtype=np.int16),
+        np.array(fan_outs, dtype=np.int16),
+        _histogram(depth_histogram),
+        _histogram(fan_out_histogram),
+        level_counts,
+    )
+
+
+def _histogram(counts):
+    # A dict of value to count as an array indexed by value
+    histogram = np.zeros(max(counts, default=-1) + 1, dtype=np.int64)
+    for value, count in counts.items():
+        histogram[value] = count
+    return histogram
+
+
+def check_parity(trees, reference):
+    """
+    Compare trees (a TreeArrays) with reference trees (a teamim_tree_store.TeamimTrees, such as the anytree
+    trees of teamim-trees.py saved with save_trees). Returns the keys of the verses that differ.
+    """
+    labels = trees.label_strings()
+    keys = trees.teamim.verse_keys()
+    assert keys == reference.verse_keys, "the trees aren't of the same verses"
+
+    different = []
+    for i, key in enumerate(keys):
+        start, end = trees.verse_offsets[i], trees.verse_offsets[i + 1]
+        reference_start, reference_end = reference.verse_offsets[i], reference.verse_offsets[i + 1]
+        if not (np.array_equal(labels[start:end], reference.labels[reference_start:reference_end])
+                and np.array_equal(trees.parents[start:end], reference.parents[reference_start:reference_end])):
+            different.append(key)
+    return different
+
+
+if __name__ == "__main__":
+    teamim = load_teamim_codes()
+    start = time.perf_counter()
+    trees = build_trees(teamim)
+    elapsed = time.perf_counter() - start
+    print(f"{len(trees)} trees, {len(trees.labels)} nodes in {elapsed:.3f}s")
+    print(f"Depths: {dict(enumerate(trees.depth_histogram.tolist()))}")
+    print(f"Fan-outs: {dict(enumerate(trees.fan_out_histogram.tolist()))}")
+    print(f"Nodes by level: {trees.level_counts.sum(axis=0).tolist()}")
@@ -0,0 +1,143 @@
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from teamim_tree_store import load_trees
+
+"""Hashed subtree-pattern features of the teamim trees, for the classifiers.
+Two families of patterns are taken from the trees of teamim_tree_store.py:
+    paths: the labels on the way from an ancestor down to a node, parent -> child, of 1 to max_path nodes
+    subtrees: the subtree rooted at a node, cut after 1 to max_depth levels (the node's label, then the
+        node with the ordered labels of its children, and so on)
+Every pattern is a 64 bit code computed for all the nodes of all the verses at once from the parent arrays,
+one pass per path length or subtree depth, so the work is linear in the number of nodes. The codes are
+hashed into the n_features columns of a sparse matrix with one row per verse, the same way in every run
+(unlike Python's hash)."""
+
+N_FEATURES = 2 ** 12
+MAX_PATH = 3
+MAX_DEPTH = 3
+
+PATHS = 1
+SUBTREES = 2
+
+# Constants of splitmix64
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(codes):
+    # The splitmix64 finalizer, which spreads every bit of a code over all 64 bits. uint64 arithmetic wraps,
+    # which numpy reports as an overflow for a scalar code
+    codes = np.asarray(codes, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        codes = (codes ^ (codes >> np.uint64(30))) * _MIX_1
+        codes = (codes ^ (codes >> np.uint64(27))) * _MIX_2
+    return codes ^ (codes >> np.uint64(31))
+
+
+def _label_codes(trees):
+    # Every node's label as the index of the label among the sorted labels, from 1
+    _, label_ids = np.unique(trees.labels, return_inverse=True)
+    return label_ids.astype(np.uint64) + np.uint64(1)
+
+
+def _sibling_ranks(parents):
+    # Position of every node among the children of its parent (nodes are in preorder, so siblings are in order)
+    order = np.argsort(parents, kind="stable")
+    sorted_parents = parents[order]
+    group_starts = np.flatnonzero(np.concatenate([[True], sorted_parents[1:] != sorted_parents[:-1]]))
+    group_sizes = np.diff(np.append(group_starts, len(parents)))
+    ranks = np.empty(len(parents), dtype=np.int64)
+    ranks[order] = np.arange(len(parents)) - np.repeat(group_starts, group_sizes)
+    return ranks
+
+
+def path_patterns(trees, max_path=MAX_PATH):
+    """
+    For every path length from 1 to max_path, the nodes at the end of a path of that length and the codes
+    of the paths.
+    """
+    parents = trees.global_parents()
+    has_parent = parents >= 0
+    safe_parents = np.where(has_parent, parents, 0)
+    labels = _label_codes(trees)
+
+    codes = labels
+    valid = np.ones(len(parents), dtype=bool)
+    patterns = [(np.flatnonzero(valid), codes)]
+    for _ in range(2, max_path + 1):
+        # The path that ends at the parent, extended by the node
+        codes = _mix(codes[safe_parents] ^ _GOLDEN) + labels
+        valid = has_parent & valid[safe_parents]
+        patterns.append((np.flatnonzero(valid), codes[valid]))
+    return patterns
+
+
+def subtree_patterns(trees, max_depth=MAX_DEPTH):
+    """
+    For every depth from 1 to max_depth, the nodes whose subtree reaches that depth and the codes of
+    their subtrees cut at that depth.
+    """
+    parents = trees.global_parents()
+    has_parent = parents >= 0
+    children = np.flatnonzero(has_parent)
+    labels = _label_codes(trees)
+    # Every child's hash depends on its position, so the order of the children is part of the pattern
+    positions = _mix(_sibling_ranks(parents)[children].astype(np.uint64) + np.uint64(1))
+
+    codes = labels
+    reaches = np.ones(len(parents), dtype=bool)
+    patterns = [(np.flatnonzero(reaches), codes)]
+    for _ in range(2, max_depth + 1):
+        # The node's label and the subtrees of its children, one level shallower
+        combined = np.zeros(len(parents), dtype=np.uint64)
+        np.add.at(combined, parents[children], _mix(codes[children] ^ positions))
+        codes = _mix(combined + labels * _GOLDEN)
+        reaches = np.bincount(parents[children], weights=reaches[children], minlength=len(parents)) > 0
+        patterns.append((np.flatnonzero(reaches), codes[reaches]))
+    return patterns
+
+
+def tree_pattern_matrix(trees=None, keys=None, n_features=N_FEATURES, max_path=MAX_PATH, max_depth=MAX_DEPTH):
+    """
+    The hashed pattern counts of every tree as a sparse matrix of n_features columns, with rows normalized to
+    unit length. The rows are the verses of trees (loaded from teamim-trees.npz when None), or the verses of
+    keys ("book:chapter:verse"), with an empty row for a key that has no tree.
+    """
+    trees = trees if trees is not None else load_trees()
+    node_verse = np.repeat(np.arange(len(trees)), np.diff(trees.verse_offsets))
+
+    rows, columns = [], []
+    for family, patterns in ((PATHS, path_patterns(trees, max_path)), (SUBTREES, subtree_patterns(trees, max_depth))):
+        for size, (nodes, codes) in enumerate(patterns, start=1):
+            # The family and size are part of the hash, so a path and a subtree with the same code don't collide
+            tag = _mix(np.uint64(family * 256 + size))
+            rows.append(node_verse[nodes])
+            columns.append((_mix(codes ^ tag) % np.uint64(n_features)).astype(np.int64))
+    rows = np.concatenate(rows)
+    columns = np.concatenate(columns)
+
+    # Duplicates are summed into counts, then every row is divided by its length
+    matrix = csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(trees) + 1, n_features))
+    matrix.sum_duplicates()
+    row_sizes = np.diff(matrix.indptr)
+    norms = np.sqrt(np.bincount(np.repeat(np.arange(matrix.shape[0]), row_sizes), weights=matrix.data ** 2,
+                                minlength=matrix.shape[0]))
+    matrix.data /= np.repeat(norms, row_sizes)
+
+    # The last row is empty, for keys without a tree
+    if keys is None:
+        return matrix[:len(trees)]
+    index = {key: i for i, key in enumerate(trees.verse_keys)}
+    return matrix[[index.get(key, len(trees)) for key in keys]]
+
+
+if __name__ == "__main__":
+    trees = load_trees()
+    start = time.perf_counter()
+    matrix = tree_pattern_matrix(trees)
+    elapsed = time.perf_counter() - start
+    print(f"{matrix.shape[0]} trees, {matrix.nnz} non-zero features of {matrix.shape[1]} in {elapsed:.3f}s")
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+from anytree import Node, PreOrderIter, RenderTree
+
+from verse_registry import source_names, verse_ids
+
+"""Structured storage of the teamim trees.
+Every tree is kept as its node labels in preorder (the order RenderTree prints them, the root first)
+and the index of each node's parent within the verse (-1 for the root). The nodes of all the verses
+are concatenated into flat arrays, and verse_offsets marks where each verse starts, CSR style, so
+depths and texts are computed with array operations instead of scanning the box-drawing text.
+The RenderTree text is still available as a view, with render_text."""
+
+TREES_PATH = "teamim-trees.npz"
+
+
+def tree_arrays(root):
+    """
+    Labels and parent indices of an anytree tree, in preorder.
+    """
+    nodes = list(PreOrderIter(root))
+    index = {id(node): i for i, node in enumerate(nodes)}
+    labels = [str(node.name) for node in nodes]
+    parents = [index[id(node.parent)] if node.parent is not None else -1 for node in nodes]
+    return labels, parents
+
+
+def save_trees(trees, trees_path=TREES_PATH):
+    """
+    Save a dict of "book:chapter:verse" keys to anytree roots (as built by teamim-trees.py).
+    """
+    labels, parents, offsets = [], [], [0]
+    for root in trees.values():
+        tree_labels, tree_parents = tree_arrays(root)
+        labels.extend(tree_labels)
+        parents.extend(tree_parents)
+        offsets.append(len(labels))
+
+    # The teamim codes are a handful of strings, so every node keeps the index of its label
+    label_names, label_ids = np.unique(np.array(labels, dtype=str), return_inverse=True)
+    book, chapter, verse = np.array([key.split(":") for key in trees], dtype=np.int16).T.reshape(3, -1)
+    save_tree_arrays(trees_path, book, chapter, verse, offsets, label_names, label_ids, parents)
+
+
+def save_tree_arrays(trees_path, verse_book, verse_chapter, verse_number, verse_offsets, label_names, label_ids, parents):
+    """
+    Save trees that are already arrays (as built by teamim_tree_engine.py): labels are label_names[label_ids],
+    and the nodes of every verse are in preorder with parent indices within the verse.
+    """
+    np.savez_compressed(trees_path,
+                        verse_book=np.asarray(verse_book, dtype=np.int8),
+                        verse_chapter=np.asarray(verse_chapter, dtype=np.int16),
+                        verse_number=np.asarray(verse_number, dtype=np.int16),
+                        verse_offsets=np.asarray(verse_offsets, dtype=np.int32),
+                        label_names=np.asarray(label_names, dtype=str),
+                        label_ids=np.asarray(label_ids, dtype=np.uint8),
+                        parents=np.asarray(parents, dtype=np.int8))
+
+
+class TeamimTrees:
+    """
+    The saved trees. The nodes of verse i are verse_offsets[i]:verse_offsets[i + 1], root first.
+    """
+
+    def __init__(self, trees_path=TREES_PATH):
+        with np.load(trees_path, allow_pickle=False) as saved:
+            self.verse_book = saved["verse_book"]
+            self.verse_chapter = saved["verse_chapter"]
+            self.verse_number = saved["verse_number"]
+            self.verse_offsets = saved["verse_offsets"]
+            self.labels = saved["label_names"][saved["label_ids"]]
+            self.parents = saved["parents"]
+        # "book:chapter:verse" keys, in the form of the teamim files
+        self.verse_keys = [f"{book}:{chapter}:{verse}" for book, chapter, verse in
+                           zip(self.verse_book, self.verse_chapter, self.verse_number)]
+
+    def __len__(self):
+        return len(self.verse_keys)
+
+    def verse_ids(self):
+        # Registry ids of the verses (-1 for a key that isn't in the registry)
+        return verse_ids(self.verse_book, self.verse_chapter, self.verse_number)
+
+    def global_parents(self):
+        # Parent of every node as an index into the flat arrays
+        node_verse = np.repeat(np.arange(len(self)), np.diff(self.verse_offsets))
+        return np.where(self.parents >= 0, self.parents + self.verse_offsets[node_verse], -1)
+
+    def node_depths(self):
+        """
+        Depth of every node, the root at 0. Each pass adds one level, so the loop runs as many times
+        as the deepest tree is deep.
+        """
+        parents = self.global_parents()
+        has_parent = parents >= 0
+        depths = np.zeros(len(parents), dtype=np.int16)
+        while True:
+            new_depths = np.where(has_parent, depths[np.where(has_parent, parents, 0)] + 1, 0).astype(np.int16)
+            if np.array_equal(new_depths, depths):
+                return depths
+            depths = new_depths
+
+    def depths(self):
+        # Depth of every tree: the depth of its deepest node
+        return np.maximum.reduceat(self.node_depths(), self.verse_offsets[:-1])
+
+    def fan_outs(self):
+        # Largest number of children of a node of every tree
+        children = np.bincount(self.global_parents() + 1, minlength=len(self.parents) + 1)[1:]
+        return np.maximum.reduceat(children, self.verse_offsets[:-1])
+
+    def tree_metrics(self):
+        """
+        One row per tree: its verse key, verse id and source, its depth, its number of nodes (the root
+        included) and the largest number of children of one of its nodes.
+        """
+        ids = self.verse_ids()
+        return pd.DataFrame({
+            "Verse": self.verse_keys,
+            "Verse ID": ids,
+            "Source": source_names(ids),
+            "Depth": self.depths(),
+            "Node Count": np.diff(self.verse_offsets),
+            "Max Fan-out": self.fan_outs(),
+        })
+
+    def texts(self):
+        # The labels of every tree in preorder, space-joined, as a dict by verse key
+        return {key: " ".join(self.labels[start:end]) for key, start, end in
+                zip(self.verse_keys, self.verse_offsets[:-1], self.verse_offsets[1:])}
+
+    def tree(self, i):
+        # Verse i as an anytree tree
+        start, end = self.verse_offsets[i], self.verse_offsets[i + 1]
+        nodes = []
+        for label, parent in zip(self.labels[start:end], self.parents[start:end]):
+            nodes.append(Node(str(label), parent=nodes[parent] if parent >= 0 else None))
+        return nodes[0]
+
+    def render_text(self, file, headers=None):
+        """
+        Write the trees as RenderTree text, each one after a header line ("P: <key>" by default).
+        """
+        headers = headers if headers is not None else [f"P: {key}" for key in self.verse_keys]
+        for i, header in enumerate(headers):
+            file.write(f"\n{header}\n")
+            for pre, _, node in RenderTree(self.tree(i)):
+                file.write(f"{pre}{node.name}\n")
+
+
+def load_trees(trees_path=TREES_PATH):
+    return TeamimTrees(trees_path)
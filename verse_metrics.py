@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from corpus_table import read_table, table_path, write_table
+from dicta_store import Vocabulary
+from shebanq_parser import BOOK_FILES, book_name_of, iter_books, iter_verses
+from verse_registry import VERSE_COUNT, ids_from_xml_ids, source_names
+
+"""One pass over the SHEBANQ files that gives the verse level metrics of both statistics scripts.
+Every verse is one row of the verse_metrics table: its book, chapter, verse and verse id, its number of
+w elements, of words and of unique words, the sum of the lengths of its words, and its words as ids of the
+verse_vocabulary table, for frequency counts. The two scripts didn't take the same words, and both are kept:
+    Total Words, Unique Words, Word Length Sum, Token IDs: the text of every w element inside the verse
+        (.//w), as it is, empty ones skipped, as statistics_by_books.py took them
+    Word Elements: the number of w elements that are children of the verse
+    Child Words, Child Unique Words, Child Word Length Sum, Child Token IDs: the stripped text of the w
+        children of the verse, empty ones skipped, as statistics_by_sources.py took them
+Sources aren't stored; they are looked up through the verse ids when the table is loaded."""
+
+METRICS_TABLE = "verse_metrics"
+VOCABULARY_TABLE = "verse_vocabulary"
+
+WORD_COLUMNS = ["Total Words", "Unique Words", "Word Length Sum", "Token IDs"]
+# The columns of the words of the w children, and the columns of every w element they stand for
+CHILD_COLUMNS = {"Child Words": "Total Words", "Child Unique Words": "Unique Words",
+                 "Child Word Length Sum": "Word Length Sum", "Child Token IDs": "Token IDs"}
+COLUMNS = ["Book", "Chapter", "Verse", "Word Elements"] + WORD_COLUMNS + list(CHILD_COLUMNS)
+
+
+def _word_metrics(words, vocabulary):
+    # Number of words and of unique words, sum of their lengths and token ids
+    token_ids = np.array([vocabulary.intern(word) for word in words], dtype=np.int32)
+    return [len(words), len(np.unique(token_ids)), sum(len(word) for word in words), token_ids]
+
+
+def extract_verse_metrics(file_paths=BOOK_FILES, workers=None):
+    """
+    Parse the books (on a process pool, see shebanq_parser.iter_books) and return the metrics table
+    and the vocabulary, as an array of words indexed by token id in order of first appearance.
+    """
+    vocabulary = Vocabulary()
+    rows = []
+    xml_ids = []
+    for file_path, verses in iter_books(file_paths, iter_verses, workers):
+        book = book_name_of(file_path)
+
+        for verse in verses:
+            xml_ids.append(verse["xml_id"])
+            words = [word for word in verse["words"] if word]
+            child_words = [word.strip() for word in verse["child_words"] if word.strip()]
+
+            # Chapter and verse from the xml:id (<prefix>.<book>.<chapter>.<verse>), -1 without one
+            parts = verse["xml_id"].split(".")
+            chapter, number = (int(parts[-2]), int(parts[-1])) if len(parts) >= 4 else (-1, -1)
+
+            rows.append([book, chapter, number, len(verse["child_words"])]
+                        + _word_metrics(words, vocabulary) + _word_metrics(child_words, vocabulary))
+
+    metrics = pd.DataFrame(rows, columns=COLUMNS)
+    # The verse ids of all the books at once, once the verses have been read
+    metrics.insert(3, "Verse ID", ids_from_xml_ids(xml_ids, metrics["Book"].to_numpy()))
+    return metrics, np.array(vocabulary.strings, dtype=object)
+
+
+def build_verse_metrics(file_paths=BOOK_FILES, workers=None):
+    metrics, vocabulary = extract_verse_metrics(file_paths, workers)
+    write_table(metrics, METRICS_TABLE)
+    write_table(pd.DataFrame({"Word": vocabulary}), VOCABULARY_TABLE)
+    return metrics, vocabulary
+
+
+def _is_stale(file_paths):
+    # The table is rebuilt when it is missing, has other columns, or is older than one of the XML files
+    if not os.path.exists(table_path(METRICS_TABLE)):
+        return True
+    if not set(COLUMNS) <= set(pq.ParquetFile(table_path(METRICS_TABLE)).schema_arrow.names):
+        return True
+    built = os.path.getmtime(table_path(METRICS_TABLE))
+    return any(os.path.getmtime(file_path) > built for file_path in file_paths)
+
+
+def load_verse_metrics(file_paths=BOOK_FILES, workers=None):
+    """
+    The metrics table, with the Source of every verse, and the vocabulary. The XML files are only
+    parsed when the table is missing or out of date, so the second statistics script reuses it.
+    """
+    if _is_stale(file_paths):
+        metrics, vocabulary = build_verse_metrics(file_paths, workers)
+    else:
+        metrics = read_table(METRICS_TABLE)
+        vocabulary = read_table(VOCABULARY_TABLE)["Word"].to_numpy(dtype=object)
+    metrics["Source"] = source_names(metrics["Verse ID"].to_numpy())
+    return metrics, vocabulary
+
+
+def verse_word_counts(file_paths=BOOK_FILES, workers=None):
+    """
+    The number of w elements of every verse, by verse id (0 for a verse that isn't in the files), from the
+    metrics table, which is built first when it is out of date. Unlike load_verse_metrics it doesn't need the
+    sources, so books_to_sources.py can use it. None when neither the XML files nor the table are there.
+    """
+    if all(os.path.exists(file_path) for file_path in file_paths):
+        if _is_stale(file_paths):
+            build_verse_metrics(file_paths, workers)
+    elif not os.path.exists(table_path(METRICS_TABLE)):
+        return None
+    metrics = read_table(METRICS_TABLE, columns=["Verse ID", "Word Elements"])
+
+    counts = np.zeros(VERSE_COUNT, dtype=np.int64)
+    known = metrics["Verse ID"].to_numpy() >= 0
+    counts[metrics["Verse ID"].to_numpy()[known]] = metrics["Word Elements"].to_numpy()[known]
+    return counts
+
+
+def child_words(metrics):
+    # The metrics with the words of the w children of the verse in place of the words of every w element
+    return metrics.drop(columns=WORD_COLUMNS).rename(columns=CHILD_COLUMNS)
+
+
+def verse_texts(metrics, vocabulary):
+    # The words of every verse, space-joined
+    return [" ".join(vocabulary[token_ids]) for token_ids in metrics["Token IDs"]]
+
+
+def word_frequencies(metrics, vocabulary, by=None):
+    """
+    A Word, Frequency table, or a <by>, Word, Frequency table with the frequencies of every group of
+    the column `by` (such as "Book" or "Source", or a list of columns such as ["Book", "Source"]).
+    Groups and words keep their order of first appearance.
+    """
+    # Seeded with an empty array, for a table without rows
+    token_ids = np.concatenate([np.empty(0, dtype=np.int64)]
+                               + [np.asarray(ids, dtype=np.int64) for ids in metrics["Token IDs"]])
+    if by is None:
+        # In order of first appearance in these verses, which isn't the order of the vocabulary
+        tokens, first, counts = np.unique(token_ids, return_index=True, return_counts=True)
+        order = np.argsort(first, kind="stable")
+        return pd.DataFrame({"Word": vocabulary[tokens[order]], "Frequency": counts[order]})
+
+    # Groups numbered in order of first appearance, with the values of the columns of every group
+    by = [by] if isinstance(by, str) else list(by)
+    verse_groups = metrics.groupby(by, sort=False, observed=True).ngroup().to_numpy()
+    groups = metrics[by].drop_duplicates()
+
+    pairs = pd.DataFrame({"group": np.repeat(verse_groups, metrics["Total Words"]), "token": token_ids})
+    counts = pairs.groupby(["group", "token"], sort=False).size().reset_index(name="Frequency")
+    counts = counts.sort_values("group", kind="stable")
+
+    frequencies = pd.DataFrame({column: groups[column].take(counts["group"]).reset_index(drop=True) for column in by})
+    frequencies["Word"] = vocabulary[counts["token"]]
+    frequencies["Frequency"] = counts["Frequency"].to_numpy()
+    return frequencies
+
+
+if __name__ == "__main__":
+    metrics, vocabulary = build_verse_metrics()
+    print(f"Saved the metrics of {len(metrics)} verses ({len(vocabulary)} distinct words) to {table_path(METRICS_TABLE)}")
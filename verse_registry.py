@@ -0,0 +1,184 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from corpus_table import ensure_table, read_table
+
+"""One dense integer id for every verse of the five books, shared by all the scripts.
+Ids follow the book, chapter and verse order: Genesis 1:1 is 0, Genesis 1:2 is 1, and so on.
+The converters take whole arrays or lists of verse references in each of the formats used in the
+project and return an array of ids, with -1 for a verse that is not in the table."""
+
+BOOKS = ["Genesis", "Exodus", "Leviticus", "Numbers", "Deuteronomy"]
+
+# Book abbreviations of Teamim.xlsx
+BOOK_CODES = {'gn': 0, 'ex': 1, 'lv': 2, 'nu': 3, 'dt': 4}
+
+# מספר פסוקים בכל פרק - מבוסס על התנ"ך המסורתי
+verses_per_chapter = {
+    "Genesis": {1: 31, 2: 25, 3: 24, 4: 26, 5: 32, 6: 22, 7: 24, 8: 22, 9: 29, 10: 32,
+                11: 32, 12: 20, 13: 18, 14: 24, 15: 21, 16: 16, 17: 27, 18: 33, 19: 38, 20: 18,
+                21: 34, 22: 24, 23: 20, 24: 67, 25: 34, 26: 35, 27: 46, 28: 22, 29: 35, 30: 43,
+                31: 55, 32: 33, 33: 20, 34: 31, 35: 29, 36: 43, 37: 36, 38: 30, 39: 23, 40: 23,
+                41: 57, 42: 38, 43: 34, 44: 34, 45: 28, 46: 34, 47: 31, 48: 22, 49: 33, 50: 26},
+
+    "Exodus": {1: 22, 2: 25, 3: 22, 4: 31, 5: 23, 6: 30, 7: 29, 8: 32, 9: 35, 10: 29,
+                11: 10, 12: 51, 13: 22, 14: 31, 15: 27, 16: 36, 17: 16, 18: 27, 19: 25, 20: 26,
+                21: 37, 22: 30, 23: 33, 24: 18, 25: 40, 26: 37, 27: 21, 28: 43, 29: 46, 30: 38,
+                31: 18, 32: 35, 33: 23, 34: 35, 35: 35, 36: 38, 37: 29, 38: 31, 39: 43, 40: 38},
+
+    "Leviticus": {1: 17, 2: 16, 3: 17, 4: 35, 5: 26, 6: 23, 7: 38, 8: 36, 9: 24, 10: 20,
+                    11: 47, 12: 8, 13: 59, 14: 57, 15: 33, 16: 34, 17: 16, 18: 30, 19: 37, 20: 27,
+                    21: 24, 22: 33, 23: 44, 24: 23, 25: 55, 26: 46, 27: 34},
+
+    "Numbers": {1: 54, 2: 34, 3: 51, 4: 49, 5: 31, 6: 27, 7: 89, 8: 26, 9: 23, 10: 36,
+                11: 35, 12: 16, 13: 33, 14: 45, 15: 41, 16: 50, 17: 28, 18: 32, 19: 22, 20: 29,
+                21: 35, 22: 41, 23: 30, 24: 25, 25: 19, 26: 65, 27: 23, 28: 31, 29: 40, 30: 17,
+                31: 54, 32: 42, 33: 56, 34: 29, 35: 34, 36: 13},
+
+    "Deuteronomy": {1: 46, 2: 37, 3: 29, 4: 49, 5: 33, 6: 25, 7: 26, 8: 20, 9: 29, 10: 22,
+                    11: 32, 12: 32, 13: 19, 14: 29, 15: 23, 16: 22, 17: 20, 18: 22, 19: 21, 20: 20,
+                    21: 23, 22: 30, 23: 26, 24: 22, 25: 19, 26: 19, 27: 26, 28: 69, 29: 28, 30: 20,
+                    31: 30, 32: 52, 33: 29, 34: 12}
+}
+
+SOURCES_TABLE = "books_to_sources"
+SOURCES_CACHE = "books_to_sources.npz"
+
+# Number of verses in every chapter, as an array indexed by [book, chapter]
+MAX_CHAPTER = max(max(chapters) for chapters in verses_per_chapter.values())
+CHAPTER_SIZES = np.zeros((len(BOOKS), MAX_CHAPTER + 1), dtype=np.int64)
+for book_index, book in enumerate(BOOKS):
+    for chapter, count in verses_per_chapter[book].items():
+        CHAPTER_SIZES[book_index, chapter] = count
+
+# Id of the first verse of every chapter
+CHAPTER_STARTS = (np.cumsum(CHAPTER_SIZES.ravel()) - CHAPTER_SIZES.ravel()).reshape(CHAPTER_SIZES.shape)
+VERSE_COUNT = int(CHAPTER_SIZES.sum())
+
+# Book index, chapter and verse number of every id
+VERSE_BOOK, VERSE_CHAPTER = np.nonzero(CHAPTER_SIZES)
+VERSE_BOOK = np.repeat(VERSE_BOOK, CHAPTER_SIZES[VERSE_BOOK, VERSE_CHAPTER])
+VERSE_CHAPTER = np.repeat(VERSE_CHAPTER, CHAPTER_SIZES[np.nonzero(CHAPTER_SIZES)])
+VERSE_NUMBER = np.arange(VERSE_COUNT) - CHAPTER_STARTS[VERSE_BOOK, VERSE_CHAPTER] + 1
+
+
+def book_indices(books):
+    """
+    Book indices (0-4) for an array of book names in any case, Teamim.xlsx abbreviations or book numbers.
+    Unknown books get -1.
+    """
+    books = np.asarray(books)
+    if books.dtype.kind in "iu":
+        return np.where((books >= 0) & (books < len(BOOKS)), books, -1)
+
+    names = {book.lower(): index for index, book in enumerate(BOOKS)}
+    names.update(BOOK_CODES)
+    names.update({str(index): index for index in range(len(BOOKS))})
+
+    # Looking up every distinct value once
+    unique_books, inverse = np.unique(books.astype(str), return_inverse=True)
+    unique_indices = np.array([names.get(book.strip().lower(), -1) for book in unique_books], dtype=np.int64)
+    return unique_indices[inverse].reshape(books.shape)
+
+
+def verse_ids(books, chapters, verses):
+    """
+    Ids for arrays of books, chapters and verses. Chapters and verses may be numbers or numeric strings.
+    """
+    books = book_indices(books)
+    chapters = np.asarray(chapters).astype(np.int64)
+    verses = np.asarray(verses).astype(np.int64)
+    books, chapters, verses = np.broadcast_arrays(books, chapters, verses)
+
+    valid = (books >= 0) & (chapters >= 1) & (chapters <= MAX_CHAPTER) & (verses >= 1)
+    safe_books = np.where(valid, books, 0)
+    safe_chapters = np.where(valid, chapters, 0)
+    valid &= verses <= CHAPTER_SIZES[safe_books, safe_chapters]
+
+    return np.where(valid, CHAPTER_STARTS[safe_books, safe_chapters] + verses - 1, -1)
+
+
+def ids_from_tuples(verse_tuples):
+    # ("genesis", 1, 1) tuples, as in the *_by_source.py scripts
+    if len(verse_tuples) == 0:
+        return np.zeros(0, dtype=np.int64)
+    books, chapters, verses = zip(*verse_tuples)
+    return verse_ids(list(books), list(chapters), list(verses))
+
+
+def _ids_from_pattern(strings, pattern, books=None):
+    # Extracting the numbers with one vectorized regular expression over all the strings
+    parts = pd.Series(np.asarray(strings, dtype=str)).str.extract(pattern)
+    valid = parts.notna().all(axis=1).to_numpy()
+    parts = parts.fillna(0)
+
+    if books is None:
+        books = parts["book"].to_numpy()
+        books = np.where(valid, books, -1).astype(np.int64)
+    ids = verse_ids(books, parts["chapter"].to_numpy(), parts["verse"].to_numpy())
+    return np.where(valid, ids, -1)
+
+
+def ids_from_keys(keys):
+    # "0:1:1" keys of the teamim files
+    return _ids_from_pattern(keys, r"^\s*(?P<book>\d+):(?P<chapter>\d+):(?P<verse>\d+)")
+
+
+def ids_from_xml_ids(xml_ids, books):
+    # xml:id attributes of the SHEBANQ verses, which end with .<chapter>.<verse>
+    return _ids_from_pattern(xml_ids, r"\.(?P<chapter>\d+)\.(?P<verse>\d+)$", book_indices(books))
+
+
+def ids_from_display_names(books, chapter_names, verse_names):
+    # "Chapter N" and "Pasuk N" DisplayName_Eng attributes of SHEBANQ
+    chapters = pd.Series(np.asarray(chapter_names, dtype=str)).str.extract(r"(\d+)")[0].fillna(0)
+    verses = pd.Series(np.asarray(verse_names, dtype=str)).str.extract(r"(\d+)")[0].fillna(0)
+    return verse_ids(books, chapters.to_numpy(), verses.to_numpy())
+
+
+def teamim_keys(ids):
+    # The reverse of ids_from_keys
+    ids = np.asarray(ids)
+    return [f"{book}:{chapter}:{verse}" for book, chapter, verse in
+            zip(VERSE_BOOK[ids], VERSE_CHAPTER[ids], VERSE_NUMBER[ids])]
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def verse_sources(table_name=SOURCES_TABLE, cache_path=SOURCES_CACHE):
+    """
+    The source of every verse, as an array of source codes indexed by verse id (-1 for no source),
+    and the list of source names. Built once from the books_to_sources table and kept in a cache file
+    that is rebuilt whenever the table changes.
+    """
+    signature = _file_signature(ensure_table(table_name))
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as cache:
+            if np.array_equal(cache["signature"], signature):
+                return cache["sources"], cache["names"].tolist()
+
+    df = read_table(table_name, columns=["Book", "Chapter", "Verse", "Source"])
+    ids = verse_ids(df["Book"].to_numpy(), df["Chapter"].to_numpy(), df["Verse"].to_numpy())
+    codes, names = pd.factorize(df["Source"].astype(str).str.strip())
+
+    sources = np.full(VERSE_COUNT, -1, dtype=np.int8)
+    known = ids >= 0
+    sources[ids[known]] = codes[known]
+
+    np.savez(cache_path, signature=signature, sources=sources, names=np.array(names, dtype=str))
+    return sources, list(names)
+
+
+def source_names(ids, unknown="Unknown"):
+    """
+    Source name of every verse id, with `unknown` for verses that have no source.
+    """
+    sources, names = verse_sources()
+    ids = np.asarray(ids)
+    codes = np.where(ids >= 0, sources[np.where(ids >= 0, ids, 0)], -1)
+    return np.array(names + [unknown], dtype=object)[codes]